@@ -0,0 +1,281 @@
+import asyncio
+import hmac
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Annotated, Dict, List, Literal, Optional
+from fastapi import FastAPI, Header, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, ConfigDict, Field
+from dotenv import load_dotenv
+from pipeline.pipeline import AnimePipeline
+from src.session import ResultSession
+from utils.custom_exception import RecommendationError
+from utils.profiling import MODES, profiler
+from utils.logger import logger
+
+load_dotenv()
+
+MAX_BATCH_SIZE = 16
+# Enough for every title and genre, for clients that filter suggestions locally
+MAX_SUGGESTIONS = 500
+# Most LLM recommendations per request; fits the default LLM_MAX_OUTPUT_TOKENS (2048)
+MAX_RESULTS = 10
+
+_pipeline: Optional[AnimePipeline] = None
+
+def load_pipeline() -> AnimePipeline:
+    """
+    Build the process-wide pipeline once.
+
+    Called at import time so that a pre-forking server (gunicorn with
+    ``preload_app``) loads the read-only indexes in the master process and
+    every worker inherits them copy-on-write.
+    """
+    global _pipeline
+    if _pipeline is None:
+        started = time.perf_counter()
+        _pipeline = AnimePipeline()
+        logger.info(f"Pipeline loaded in {time.perf_counter() - started:.2f}s")
+    return _pipeline
+
+try:
+    load_pipeline()
+except RecommendationError as e:
+    # Keep the app importable; /ready reports the failure and the
+    # lifespan hook retries in the worker.
+    logger.error(f"Pipeline preload failed: {str(e)}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if _pipeline is None:
+        try:
+            await run_in_threadpool(load_pipeline)
+        except RecommendationError as e:
+            logger.error(f"Pipeline load failed in worker: {str(e)}")
+    yield
+
+app = FastAPI(title="AnimeFinder API", version="0.1.0", lifespan=lifespan)
+
+class RecommendRequest(BaseModel):
+    query: str = Field(..., min_length=2, max_length=200)
+    deadline_ms: Optional[int] = Field(None, ge=100, le=60000)
+    limit: int = Field(5, ge=1, le=MAX_RESULTS)
+
+class BatchRecommendRequest(BaseModel):
+    queries: List[str] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE)
+    deadline_ms: Optional[int] = Field(None, ge=100, le=60000)
+    limit: int = Field(5, ge=1, le=MAX_RESULTS)
+
+class SuggestionRequest(BaseModel):
+    kind: Literal["title", "genre"]
+    value: str = Field(..., min_length=1, max_length=200)
+    limit: int = Field(5, ge=1, le=20)
+
+class SessionRequest(BaseModel):
+    query: str = Field(..., min_length=2, max_length=200)
+    page_size: int = Field(5, ge=1, le=MAX_RESULTS)
+
+class SessionCandidate(BaseModel):
+    # Reranking reads a few more fields; the session coerces those itself
+    model_config = ConfigDict(extra="allow")
+    anime: str = Field(..., min_length=1, max_length=ResultSession.MAX_TEXT_LEN)
+
+class SessionState(BaseModel):
+    """The `session` a /session call returned, bounded since the client can rewrite it"""
+    query: str = Field(..., min_length=2, max_length=ResultSession.MAX_TEXT_LEN)
+    page_size: int = Field(5, ge=1, le=MAX_RESULTS)
+    candidates: List[SessionCandidate] = Field(default_factory=list, max_length=ResultSession.MAX_CANDIDATES)
+    refinements: List[Annotated[str, Field(max_length=ResultSession.MAX_TEXT_LEN)]] = Field(
+        default_factory=list, max_length=ResultSession.MAX_REFINEMENTS
+    )
+    include: List[Annotated[str, Field(max_length=50)]] = Field(default_factory=list, max_length=100)
+    exclude: List[Annotated[str, Field(max_length=50)]] = Field(default_factory=list, max_length=100)
+    genre_weights: Dict[str, float] = Field(default_factory=dict, max_length=100)
+    term_weights: Dict[str, float] = Field(default_factory=dict, max_length=500)
+    anchors: List[int] = Field(default_factory=list, max_length=ResultSession.MAX_CANDIDATES)
+    min_score: Optional[float] = Field(None, ge=0, le=10)
+
+class RefineRequest(BaseModel):
+    session: SessionState
+    text: Optional[str] = Field(None, max_length=200)
+    include: Optional[List[str]] = None
+    exclude: Optional[List[str]] = None
+    min_score: Optional[float] = Field(None, ge=0, le=10)
+    page: int = Field(0, ge=0, le=50)
+
+class FollowupRequest(BaseModel):
+    recommendations: List[Dict] = Field(..., min_length=1, max_length=20)
+
+class ProfilingRequest(BaseModel):
+    mode: Optional[Literal[MODES]] = None
+    sample_rate: Optional[float] = Field(None, ge=0, le=1)
+
+def _require_admin(token: Optional[str]) -> None:
+    """Admin endpoints exist only when ADMIN_TOKEN is set, and require it in X-Admin-Token"""
+    expected = os.getenv("ADMIN_TOKEN")
+    if not expected:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not token or not hmac.compare_digest(token, expected):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+def _require_pipeline() -> AnimePipeline:
+    if _pipeline is None:
+        raise HTTPException(status_code=503, detail="Recommendation pipeline not ready")
+    return _pipeline
+
+async def _recommend(query: str, deadline_ms: Optional[int] = None, limit: int = 5) -> Dict:
+    """Run the blocking pipeline call off the event loop"""
+    pipeline = _require_pipeline()
+    started = time.perf_counter()
+    deadline_s = deadline_ms / 1000 if deadline_ms else None
+    recommendations = await run_in_threadpool(pipeline.recommend, query.strip(), deadline_s, limit)
+    return {
+        "query": query,
+        "recommendations": recommendations,
+        "degraded": any(rec.get("source") == "catalog" for rec in recommendations),
+        "latency_ms": round((time.perf_counter() - started) * 1000, 1)
+    }
+
+@app.get("/health")
+async def health() -> Dict:
+    """Liveness probe - the process is up and serving"""
+    return {"status": "ok"}
+
+@app.get("/ready")
+async def ready() -> Dict:
+    """Readiness probe - the pipeline is loaded and can take traffic"""
+    _require_pipeline()
+    return {"status": "ready"}
+
+@app.get("/stats")
+async def stats() -> Dict:
+    """Per-model latency, quality and token counters plus embedding batch histograms"""
+    pipeline = _require_pipeline()
+    return {
+        "models": pipeline.recommender.model_stats(),
+        "tokens": pipeline.recommender.token_stats(),
+        "embedding_batcher": pipeline.embedding_stats()
+    }
+
+@app.post("/recommend")
+async def recommend(request: RecommendRequest) -> Dict:
+    try:
+        return await _recommend(request.query, request.deadline_ms, request.limit)
+    except RecommendationError as e:
+        logger.error(f"API recommend failed: {str(e)}")
+        raise HTTPException(status_code=502, detail=e.message)
+
+@app.get("/autocomplete")
+async def autocomplete(
+    q: str = Query("", max_length=100),
+    limit: int = Query(8, ge=1, le=MAX_SUGGESTIONS)
+) -> Dict:
+    """Prefix suggestions over catalog titles and genres, ranked by score"""
+    pipeline = _require_pipeline()
+    return {
+        "suggestions": pipeline.suggest(q, limit),
+        "exact": pipeline.match_suggestion(q) if q else None
+    }
+
+@app.post("/recommend/suggestion")
+async def recommend_suggestion(request: SuggestionRequest) -> Dict:
+    """Catalog fast path for a selected suggestion - no LLM call"""
+    pipeline = _require_pipeline()
+    try:
+        results = pipeline.recommend_for_suggestion(request.kind, request.value, request.limit)
+    except RecommendationError as e:
+        raise HTTPException(status_code=503, detail=e.message)
+    if not results:
+        raise HTTPException(status_code=404, detail=f"Unknown {request.kind}: {request.value}")
+    return {"recommendations": results}
+
+@app.get("/similar")
+async def similar(
+    title: Optional[str] = Query(None, min_length=2),
+    mal_id: Optional[int] = None,
+    limit: int = Query(5, ge=1, le=20)
+) -> Dict:
+    """'More like this' from the precomputed similarity graph, no LLM call"""
+    if (title is None) == (mal_id is None):
+        raise HTTPException(status_code=422, detail="Pass exactly one of 'title' or 'mal_id'")
+    pipeline = _require_pipeline()
+    try:
+        results = pipeline.more_like_this(mal_id if mal_id is not None else title, limit)
+    except RecommendationError as e:
+        raise HTTPException(status_code=503, detail=e.message)
+    if not results:
+        raise HTTPException(status_code=404, detail="Title not found in catalog")
+    return {"recommendations": results}
+
+@app.post("/recommend/batch")
+async def recommend_batch(request: BatchRecommendRequest) -> Dict:
+    """Fan out queries concurrently; one failing query does not fail the batch"""
+    _require_pipeline()
+    outcomes = await asyncio.gather(
+        *(_recommend(query, request.deadline_ms, request.limit) for query in request.queries),
+        return_exceptions=True
+    )
+
+    results = []
+    for query, outcome in zip(request.queries, outcomes):
+        if isinstance(outcome, Exception):
+            detail = outcome.message if isinstance(outcome, RecommendationError) else str(outcome)
+            logger.error(f"Batch item failed for '{query}': {detail}")
+            results.append({"query": query, "recommendations": [], "error": detail})
+        else:
+            results.append(outcome)
+    return {"results": results}
+
+@app.post("/session")
+async def start_session(request: SessionRequest) -> Dict:
+    """Recommend and return a candidate pool the client sends back to /session/refine"""
+    pipeline = _require_pipeline()
+    try:
+        return await run_in_threadpool(pipeline.start_session, request.query.strip(), request.page_size)
+    except RecommendationError as e:
+        logger.error(f"API session failed: {str(e)}")
+        raise HTTPException(status_code=502, detail=e.message)
+
+@app.post("/session/refine")
+async def refine_session(request: RefineRequest) -> Dict:
+    """Refine, filter and page a session's pool locally; the LLM is only asked when it runs out"""
+    pipeline = _require_pipeline()
+    try:
+        return await run_in_threadpool(
+            pipeline.refine_session,
+            request.session.model_dump(),
+            request.text,
+            request.include,
+            request.exclude,
+            request.min_score,
+            request.page
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except RecommendationError as e:
+        raise HTTPException(status_code=503, detail=e.message)
+
+@app.post("/followups")
+async def followups(request: FollowupRequest) -> Dict:
+    """Follow-up questions that help the user refine the current results"""
+    pipeline = _require_pipeline()
+    return {"questions": await run_in_threadpool(pipeline.followup_questions, request.recommendations)}
+
+@app.get("/admin/profiling")
+async def profiling_status(x_admin_token: Optional[str] = Header(None)) -> Dict:
+    """Profiling mode and span histograms of the worker that answers"""
+    _require_admin(x_admin_token)
+    return profiler.status()
+
+@app.post("/admin/profiling")
+async def configure_profiling(request: ProfilingRequest, x_admin_token: Optional[str] = Header(None)) -> Dict:
+    """Switch profiling mode/sample rate at runtime (this worker only)"""
+    _require_admin(x_admin_token)
+    return await run_in_threadpool(profiler.configure, request.mode, request.sample_rate)
+
+@app.post("/admin/profiling/dump")
+async def dump_profiles(x_admin_token: Optional[str] = Header(None)) -> Dict:
+    """Write collected profiles to PROFILING_DIR now instead of waiting for the interval"""
+    _require_admin(x_admin_token)
+    return {"paths": await run_in_threadpool(profiler.dump)}
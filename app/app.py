@@ -1,12 +1,180 @@
+import os
 import streamlit as st
+import requests
 from pipeline.pipeline import AnimePipeline
 from dotenv import load_dotenv
 import time
-from typing import Dict
+from typing import Dict, List, Optional
 from utils.logger import logger
 
 load_dotenv()
 
+# When set, the UI is a thin client of the HTTP API (app/api.py)
+API_URL = os.getenv("ANIME_API_URL", "").rstrip("/")
+API_TIMEOUT = 90
+
+@st.cache_resource
+def get_pipeline() -> AnimePipeline:
+    """Build the pipeline once per Streamlit server, not once per search"""
+    return AnimePipeline()
+
+def _api(method: str, path: str, **kwargs) -> Dict:
+    response = requests.request(method, f"{API_URL}{path}", timeout=API_TIMEOUT, **kwargs)
+    if response.status_code >= 400:
+        try:
+            detail = response.json().get("detail", response.text)
+        except ValueError:
+            detail = response.text
+        raise RuntimeError(f"API error {response.status_code}: {detail}")
+    return response.json()
+
+@st.cache_data(ttl=3600)
+def fetch_suggestions(limit: int = 500) -> List[Dict]:
+    """Titles and genres for the type-ahead box, best-rated first"""
+    if not API_URL:
+        return get_pipeline().suggest("", limit)
+    return _api("GET", "/autocomplete", params={"limit": limit})["suggestions"]
+
+def match_suggestion(query: str) -> Optional[Dict]:
+    """A known title or genre typed in full, which can skip the LLM"""
+    if not API_URL:
+        return get_pipeline().match_suggestion(query)
+    return _api("GET", "/autocomplete", params={"q": query, "limit": 1})["exact"]
+
+def fetch_suggestion_recommendations(suggestion: Dict) -> List[Dict]:
+    """Catalog fast path for a title or genre suggestion"""
+    if not API_URL:
+        return get_pipeline().recommend_for_suggestion(suggestion['kind'], suggestion['value'])
+    return _api(
+        "POST", "/recommend/suggestion",
+        json={"kind": suggestion['kind'], "value": suggestion['value']}
+    )["recommendations"]
+
+def start_session(query: str) -> Dict:
+    """Recommendations plus a candidate pool that refinements rerank locally"""
+    if not API_URL:
+        return get_pipeline().start_session(query)
+    return _api("POST", "/session", json={"query": query})
+
+def refine_session(
+    state: Dict,
+    text: Optional[str] = None,
+    include: Optional[List[str]] = None,
+    exclude: Optional[List[str]] = None,
+    min_score: Optional[float] = None,
+    page: int = 0
+) -> Dict:
+    """Rerank/filter/page the pool - the LLM is only called when the pool runs out"""
+    if not API_URL:
+        return get_pipeline().refine_session(state, text, include, exclude, min_score, page)
+    return _api("POST", "/session/refine", json={
+        "session": state, "text": text, "include": include,
+        "exclude": exclude, "min_score": min_score, "page": page
+    })
+
+def fetch_followups(recommendations: List[Dict]) -> List[str]:
+    if not API_URL:
+        return get_pipeline().followup_questions(recommendations)
+    return _api("POST", "/followups", json={"recommendations": recommendations})["questions"]
+
+def store_results(recommendations: List[Dict], query: str, elapsed: float, view: Optional[Dict] = None):
+    """Keep the current results (and session, if refinable) across reruns"""
+    st.session_state.last_results = recommendations
+    st.session_state.last_query = query
+    st.session_state.elapsed = elapsed
+    st.session_state.session = view['session'] if view else None
+    st.session_state.page = view['page'] if view else 0
+    st.session_state.has_next = view['has_next'] if view else False
+    st.session_state.notes = view['notes'] if view else []
+    st.session_state.followups = []
+    if view:
+        # Mirror the session's filters in the widgets, including ones set by text
+        st.session_state.refine_include = view['session']['include']
+        st.session_state.refine_exclude = view['session']['exclude']
+        st.session_state.refine_min_score = view['session']['min_score'] or 0.0
+
+def apply_refinement(page: int = 0, use_text: bool = True):
+    """Widget callback: runs before the rerun, so the new page renders straight away"""
+    started = time.time()
+    try:
+        view = refine_session(
+            st.session_state.session,
+            text=st.session_state.refine_text if use_text else None,
+            include=st.session_state.refine_include,
+            exclude=st.session_state.refine_exclude,
+            min_score=st.session_state.refine_min_score,
+            page=page
+        )
+        store_results(view['recommendations'], st.session_state.last_query, time.time() - started, view)
+        st.session_state.refine_text = ""
+        st.session_state.refine_error = None
+    except Exception as e:
+        st.session_state.refine_error = str(e)
+
+def load_followups():
+    try:
+        st.session_state.followups = fetch_followups(st.session_state.last_results)
+    except Exception as e:
+        st.session_state.refine_error = str(e)
+
+def show_results(recommendations: List[Dict], elapsed: float, offset: int = 0):
+    if recommendations:
+        st.success(f"Found {len(recommendations)} recommendations")
+        if any(rec.get('source') == 'catalog' for rec in recommendations):
+            st.info("AI service is slow or unavailable - showing matches from our catalog")
+        st.caption(f"Generated in {elapsed:.1f}s")
+
+        for i, anime in enumerate(recommendations):
+            display_recommendation(anime, offset + i)
+    else:
+        st.warning("No matches found. Try different keywords.")
+
+def show_refinement(genres: List[str]):
+    """Refine the current results without starting a new search"""
+    st.markdown("---")
+    st.caption(f"Refine results for '{st.session_state.last_query}'")
+    for note in st.session_state.notes:
+        st.info(note)
+    if st.session_state.get('refine_error'):
+        st.error(f"Couldn't refine results: {st.session_state.refine_error}")
+
+    with st.form("refine_form"):
+        st.text_input(
+            "Refine these results",
+            key="refine_text",
+            placeholder="e.g. 'less violent', 'no mecha', 'more like Cowboy Bebop'"
+        )
+        cols = st.columns(3)
+        with cols[0]:
+            st.multiselect("Only genres", genres, key="refine_include")
+        with cols[1]:
+            st.multiselect("Exclude genres", genres, key="refine_exclude")
+        with cols[2]:
+            st.slider("Minimum MAL score", 0.0, 10.0, step=0.5, key="refine_min_score")
+        st.form_submit_button("Refine", on_click=apply_refinement)
+
+    cols = st.columns(3)
+    page = st.session_state.page
+    with cols[0]:
+        st.button("← Previous", disabled=page == 0, on_click=apply_refinement, args=(page - 1, False))
+    with cols[1]:
+        if st.session_state.has_next:
+            st.button("Next →", on_click=apply_refinement, args=(page + 1, False))
+        else:
+            # The pool can't fill another page: the next one asks the AI for more titles,
+            # and a short page means that already came back empty
+            st.button(
+                "Fetch more →",
+                disabled=len(st.session_state.last_results) < st.session_state.session['page_size'],
+                help="Asks the AI for more titles, so it takes longer",
+                on_click=apply_refinement,
+                args=(page + 1, False)
+            )
+    with cols[2]:
+        st.button("Suggest follow-up questions", on_click=load_followups)
+    for question in st.session_state.followups:
+        st.caption(f"💬 {question}")
+
 def display_recommendation(anime: Dict, idx: int):
     """Display recommendation card with relevance indicators"""
     with st.container(border=True):
@@ -70,6 +238,24 @@ def main():
     if 'last_results' not in st.session_state:
         st.session_state.last_results = []
         st.session_state.last_query = ""
+        st.session_state.session = None
+        st.session_state.last_pick = None
+
+    # Type-ahead quick pick: known titles/genres go straight to the catalog
+    # Failures aren't cached, so a later rerun picks them up once the API is ready
+    try:
+        suggestions = fetch_suggestions()
+    except Exception as e:
+        logger.warning(f"Suggestions unavailable: {str(e)}")
+        st.warning("Quick picks are unavailable right now - search still works")
+        suggestions = []
+    pick = st.selectbox(
+        "Quick pick",
+        suggestions,
+        index=None,
+        format_func=lambda s: f"{s['value']}  ·  {s['kind']}",
+        placeholder="Start typing a title or genre..."
+    )
 
     # Search form
     with st.form("search_form"):
@@ -89,19 +275,12 @@ def main():
             with st.spinner("Finding the perfect matches..."):
                 start_time = time.time()
                 try:
-                    pipeline = AnimePipeline()
-                    recommendations = pipeline.recommend(query.strip())
-                    st.session_state.last_results = recommendations
-                    st.session_state.last_query = query
-
-                    if recommendations:
-                        st.success(f"Found {len(recommendations)} recommendations")
-                        st.caption(f"Generated in {time.time()-start_time:.1f}s")
-
-                        for i, anime in enumerate(recommendations):
-                            display_recommendation(anime, i)
+                    known = match_suggestion(query.strip())
+                    if known:
+                        store_results(fetch_suggestion_recommendations(known), query, time.time() - start_time)
                     else:
-                        st.warning("No matches found. Try different keywords.")
+                        view = start_session(query.strip())
+                        store_results(view['recommendations'], query, time.time() - start_time, view)
 
                 except Exception as e:
                     st.error("Service temporarily unavailable")
@@ -114,12 +293,23 @@ def main():
                         """)
                         st.code(str(e))
 
-    # Show history
-    if st.session_state.last_results:
-        st.markdown("---")
-        st.caption(f"Last search: '{st.session_state.last_query}'")
-        if st.button("Search Again"):
-            st.rerun()
+    elif pick is not None and pick != st.session_state.last_pick:
+        start_time = time.time()
+        try:
+            store_results(fetch_suggestion_recommendations(pick), pick['value'], time.time() - start_time)
+        except Exception as e:
+            st.error("Service temporarily unavailable")
+            with st.expander("Details"):
+                st.code(str(e))
+    st.session_state.last_pick = pick
+
+    if st.session_state.last_query:
+        session = st.session_state.session
+        offset = st.session_state.page * session['page_size'] if session else 0
+        show_results(st.session_state.last_results, st.session_state.elapsed, offset)
+
+    if st.session_state.session:
+        show_refinement([s['value'] for s in suggestions if s['kind'] == 'genre'])
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
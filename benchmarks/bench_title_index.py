@@ -0,0 +1,94 @@
+"""
+Match-rate and lookup-latency benchmark for the catalog title index.
+
+    python -m benchmarks.bench_title_index
+
+Every catalog title is looked up in several corrupted forms (the way an LLM
+tends to write them) and the share resolved to the right row is reported
+with per-lookup latency percentiles.
+"""
+import argparse
+import csv
+import random
+import time
+from typing import Callable, Dict, List, Tuple
+from src.catalog import AnimeCatalog
+from src.title_index import TitleIndex
+
+def _drop_char(title: str, rng: random.Random) -> str:
+    if len(title) < 6:
+        return title
+    i = rng.randrange(1, len(title) - 1)
+    return title[:i] + title[i + 1:]
+
+def _swap_chars(title: str, rng: random.Random) -> str:
+    if len(title) < 6:
+        return title
+    i = rng.randrange(1, len(title) - 2)
+    return title[:i] + title[i + 1] + title[i] + title[i + 2:]
+
+VARIANTS: Dict[str, Callable[[str, random.Random], str]] = {
+    "exact": lambda title, rng: title,
+    "case_punct": lambda title, rng: title.upper().replace(":", " -").replace("!", ""),
+    "typo_drop": _drop_char,
+    "typo_swap": _swap_chars,
+    "suffix": lambda title, rng: f"{title} (TV)",
+}
+
+UNKNOWN_TITLES = [
+    "Attack on Titan", "Demon Slayer", "Jujutsu Kaisen", "Spy x Family",
+    "Vinland Saga", "Mob Psycho 100", "Made in Abyss", "Frieren",
+    # Sequels and spin-offs of catalog titles - must not resolve to the original
+    "Mobile Suit Gundam 00", "Mobile Suit Gundam Unicorn", "Fullmetal Alchemist: Brotherhood",
+    "Dragon Ball Super", "Dragon Ball Z", "Trigun Stampede", "One Piece Film Red",
+    "Naruto Shippuden", "Bleach: Thousand-Year Blood War"
+]
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def _run(index: TitleIndex, cases: List[Tuple[str, int]]) -> Tuple[float, List[float]]:
+    hits, latencies = 0, []
+    for title, expected in cases:
+        started = time.perf_counter()
+        found = index.match(title)
+        latencies.append((time.perf_counter() - started) * 1e6)
+        if found is not None and found[0] == expected:
+            hits += 1
+    return hits / len(cases), latencies
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--catalog", default="data/anime_with_synopsis.csv")
+    parser.add_argument("--aliases", default="data/title_aliases.csv")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    catalog = AnimeCatalog(args.catalog)
+    started = time.perf_counter()
+    index = TitleIndex(catalog, aliases_path=args.aliases)
+    print(f"Index build: {(time.perf_counter() - started) * 1000:.1f} ms for {len(catalog)} titles\n")
+
+    print(f"{'variant':<12} {'cases':>6} {'match':>8} {'p50 us':>8} {'p99 us':>8}")
+    for name, corrupt in VARIANTS.items():
+        cases = [(corrupt(record["name"], rng), position) for position, record in enumerate(catalog.records)]
+        rate, latencies = _run(index, cases)
+        print(f"{name:<12} {len(cases):>6} {rate:>8.1%} {_percentile(latencies, 0.5):>8.1f} "
+              f"{_percentile(latencies, 0.99):>8.1f}")
+
+    with open(args.aliases, encoding="utf-8") as f:
+        alias_cases = [
+            (row["alias"], catalog.position_of(int(row["mal_id"])))
+            for row in csv.DictReader(f)
+        ]
+    rate, latencies = _run(index, [case for case in alias_cases if case[1] is not None])
+    print(f"{'alias':<12} {len(alias_cases):>6} {rate:>8.1%} {_percentile(latencies, 0.5):>8.1f} "
+          f"{_percentile(latencies, 0.99):>8.1f}")
+
+    false_matches = sum(index.match(title) is not None for title in UNKNOWN_TITLES)
+    print(f"\nFalse matches for {len(UNKNOWN_TITLES)} titles not in the catalog: {false_matches}")
+
+if __name__ == "__main__":
+    main()
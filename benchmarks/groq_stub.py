@@ -0,0 +1,130 @@
+"""
+Local stand-in for the Groq chat-completions endpoint, for load tests.
+
+    python -m benchmarks.groq_stub --port 9100 --latency-ms 800 --error-rate 0.02
+
+Answers with catalog titles in the recommender's JSON format after a
+log-normal delay, and can inject 5xx errors and max_tokens truncation.
+"""
+import argparse
+import csv
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+
+class StubSettings:
+    def __init__(
+        self,
+        titles: List[str],
+        latency_ms: float = 800.0,
+        latency_sigma: float = 0.5,
+        error_rate: float = 0.0,
+        truncate_rate: float = 0.0
+    ):
+        self.titles = titles
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.truncate_rate = truncate_rate
+
+def load_titles(csv_path: str) -> List[str]:
+    with open(csv_path, encoding="utf-8") as f:
+        return [row["Name"] for row in csv.DictReader(f) if row.get("Name")]
+
+def _completion(settings: StubSettings, payload: dict, rng: random.Random) -> dict:
+    prompt = payload["messages"][-1]["content"]
+    found = re.search(r"Recommend (\d+) anime", prompt)
+    n_items = int(found.group(1)) if found else 5
+    items = [
+        {
+            "title": title,
+            "description": f"{title} is a stub description used for load testing.",
+            "score": rng.randint(60, 100),
+            "genres": ["Action"],
+            "year": 2000,
+            "why": "Stub recommendation."
+        }
+        for title in rng.sample(settings.titles, min(n_items, len(settings.titles)))
+    ]
+    content = json.dumps({"recommendations": items})
+    finish_reason = "stop"
+    if rng.random() < settings.truncate_rate:
+        content = content[:int(len(content) * 0.7)]
+        finish_reason = "length"
+    return {
+        "choices": [{"message": {"role": "assistant", "content": content}, "finish_reason": finish_reason}],
+        "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4},
+        "model": payload.get("model")
+    }
+
+def make_handler(settings: StubSettings):
+    rng = random.Random()
+    rng_lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            with rng_lock:
+                delay = settings.latency_ms / 1000 * math.exp(rng.gauss(0, settings.latency_sigma))
+                fail = rng.random() < settings.error_rate
+            time.sleep(delay)
+
+            if fail:
+                self._send(503, {"error": {"message": "stub overloaded"}})
+                return
+            with rng_lock:
+                response = _completion(settings, json.loads(body), rng)
+            self._send(200, response)
+
+        def _send(self, status: int, payload: dict):
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+def start_stub(settings: StubSettings, port: int = 0) -> ThreadingHTTPServer:
+    """Serve in a daemon thread; the bound port is server.server_address[1]"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(settings))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="groq-stub", daemon=True).start()
+    return server
+
+def stub_url(server: ThreadingHTTPServer) -> str:
+    return f"http://127.0.0.1:{server.server_address[1]}/openai/v1/chat/completions"
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--catalog", default="data/anime_with_synopsis.csv")
+    parser.add_argument("--latency-ms", type=float, default=800.0, help="median response delay")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="log-normal spread")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--truncate-rate", type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    settings = StubSettings(
+        load_titles(args.catalog), args.latency_ms, args.latency_sigma,
+        args.error_rate, args.truncate_rate
+    )
+    server = start_stub(settings, args.port)
+    print(f"Groq stub listening: GROQ_BASE_URL={stub_url(server)}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
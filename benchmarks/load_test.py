@@ -0,0 +1,299 @@
+"""
+Open-loop load generator that replays a query log against the recommender.
+
+    # In-process AnimePipeline, Groq replaced by the local stub
+    python -m benchmarks.load_test --log benchmarks/queries.jsonl --qps 5 --duration 60 --stub
+
+    # The HTTP API (start it with GROQ_BASE_URL pointing at benchmarks.groq_stub)
+    python -m benchmarks.load_test --target http://localhost:8000 --profile ramp --qps 1 --ramp-to 20 --pid <gunicorn master pid>
+
+Requests are fired on schedule regardless of how many are still in flight
+(open loop), so a saturated server shows up as growing latency and errors
+rather than a silently reduced request rate. Reports latency histograms,
+error rates and CPU/RSS over time as JSON.
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+from utils.metrics import Histogram, LATENCY_MS_BUCKETS
+
+try:
+    import psutil
+except ImportError:  # psutil is optional; /proc is used on Linux without it
+    psutil = None
+
+def load_queries(path: str) -> List[str]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line)["query"] for line in f if line.strip()]
+
+def rate_at(elapsed: float, args: argparse.Namespace) -> float:
+    """Target requests/second at `elapsed` seconds for the chosen profile"""
+    if args.profile == "constant":
+        return args.qps
+    if args.profile == "ramp":
+        return args.qps + (args.ramp_to - args.qps) * min(1.0, elapsed / args.duration)
+    # step: raise by `step_qps` every `step_every` seconds
+    return args.qps + args.step_qps * int(elapsed // args.step_every)
+
+class ResourceSampler:
+    """CPU% and RSS of a process and its children (e.g. gunicorn workers), sampled on a background thread"""
+
+    def __init__(self, pid: int, interval_s: float):
+        self.pid = pid
+        self.interval_s = interval_s
+        self.samples: List[Dict] = []
+        self._stop = threading.Event()
+        self._process = psutil.Process(pid) if psutil else None
+        self._clock_ticks = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+        self._page_size = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+    def _cpu_seconds_and_rss(self) -> Optional[tuple]:
+        try:
+            if self._process is not None:
+                with self._process.oneshot():
+                    times = self._process.cpu_times()
+                    children = sum(child.cpu_times().user + child.cpu_times().system
+                                   for child in self._process.children(recursive=True))
+                    rss = self._process.memory_info().rss + sum(
+                        child.memory_info().rss for child in self._process.children(recursive=True)
+                    )
+                return times.user + times.system + children, rss
+            cpu, rss = 0.0, 0
+            for pid in self._proc_tree():
+                try:
+                    with open(f"/proc/{pid}/stat") as f:
+                        fields = f.read().rsplit(")", 1)[1].split()
+                    with open(f"/proc/{pid}/statm") as f:
+                        rss += int(f.read().split()[1]) * self._page_size
+                except OSError:
+                    if pid == self.pid:
+                        raise
+                    continue  # a child exited between the scan and the read
+                cpu += (int(fields[11]) + int(fields[12])) / self._clock_ticks
+            return cpu, rss
+        except Exception:
+            return None
+
+    def _proc_tree(self) -> List[int]:
+        """`pid` and all its descendants, from the parent pid in every /proc/<pid>/stat"""
+        children: Dict[int, List[int]] = {}
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            children.setdefault(ppid, []).append(int(entry))
+        tree, stack = [], [self.pid]
+        while stack:
+            pid = stack.pop()
+            tree.append(pid)
+            stack.extend(children.get(pid, []))
+        return tree
+
+    def _run(self, started: float) -> None:
+        previous = self._cpu_seconds_and_rss()
+        previous_at = time.monotonic()
+        while not self._stop.wait(self.interval_s):
+            current = self._cpu_seconds_and_rss()
+            now = time.monotonic()
+            if current is None or previous is None:
+                continue
+            self.samples.append({
+                "t": round(now - started, 2),
+                "cpu_percent": round(100 * (current[0] - previous[0]) / (now - previous_at), 1),
+                "rss_mb": round(current[1] / 2 ** 20, 1)
+            })
+            previous, previous_at = current, now
+
+    def start(self, started: float) -> None:
+        threading.Thread(target=self._run, args=(started,), name="resource-sampler", daemon=True).start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+def pipeline_target(args: argparse.Namespace) -> Callable[[str], Dict]:
+    if args.stub:
+        from benchmarks.groq_stub import StubSettings, load_titles, start_stub, stub_url
+        server = start_stub(StubSettings(
+            load_titles(args.catalog), args.stub_latency_ms, args.stub_latency_sigma,
+            args.stub_error_rate, args.stub_truncate_rate
+        ))
+        os.environ["GROQ_BASE_URL"] = stub_url(server)
+        os.environ.setdefault("GROQ_API_KEY", "stub-key")
+
+    # Imported late so GROQ_BASE_URL is set before the recommender reads it
+    from pipeline.pipeline import AnimePipeline
+    pipeline = AnimePipeline()
+
+    def call(query: str) -> Dict:
+        results = pipeline.recommend(query)
+        return {"degraded": any(rec.get("source") == "catalog" for rec in results)}
+    return call
+
+def http_target(args: argparse.Namespace) -> Callable[[str], Dict]:
+    url = f"{args.target.rstrip('/')}/recommend"
+
+    def call(query: str) -> Dict:
+        request = urllib.request.Request(
+            url,
+            data=json.dumps({"query": query}).encode(),
+            headers={"Content-Type": "application/json"},
+            method="POST"
+        )
+        with urllib.request.urlopen(request, timeout=args.timeout) as response:
+            return {"degraded": json.loads(response.read()).get("degraded", False)}
+    return call
+
+def run(args: argparse.Namespace) -> Dict:
+    queries = load_queries(args.log)
+    call = pipeline_target(args) if args.target == "pipeline" else http_target(args)
+    latency = Histogram(LATENCY_MS_BUCKETS)
+    lag = Histogram(LATENCY_MS_BUCKETS)
+    records: List[Dict] = []
+    records_lock = threading.Lock()
+
+    def fire(query: str, scheduled: float, started: float) -> None:
+        begin = time.monotonic()
+        outcome = {"t": round(scheduled - started, 3), "error": None, "degraded": False}
+        try:
+            outcome.update(call(query))
+        except urllib.error.HTTPError as e:
+            outcome["error"] = f"http_{e.code}"
+        except Exception as e:
+            outcome["error"] = type(e).__name__
+        elapsed_ms = (time.monotonic() - begin) * 1000
+        outcome["latency_ms"] = round(elapsed_ms, 1)
+        # Time the request waited for a free client thread - should stay ~0
+        lag.observe((begin - scheduled) * 1000)
+        if outcome["error"] is None:
+            latency.observe(elapsed_ms)
+        with records_lock:
+            records.append(outcome)
+
+    sampler = ResourceSampler(args.pid or os.getpid(), args.sample_interval)
+    rng = random.Random(args.seed)
+    executor = ThreadPoolExecutor(max_workers=args.max_inflight, thread_name_prefix="load")
+    started = time.monotonic()
+    sampler.start(started)
+
+    next_at, sent = started, 0
+    while True:
+        elapsed = next_at - started
+        if elapsed >= args.duration:
+            break
+        delay = next_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        executor.submit(fire, queries[sent % len(queries)], next_at, started)
+        sent += 1
+        rate = max(rate_at(elapsed, args), 0.01)
+        next_at += rng.expovariate(rate) if args.arrivals == "poisson" else 1 / rate
+
+    executor.shutdown(wait=True)
+    sampler.stop()
+    return summarize(args, records, latency, lag, sampler.samples, time.monotonic() - started)
+
+def summarize(
+    args: argparse.Namespace,
+    records: List[Dict],
+    latency: Histogram,
+    lag: Histogram,
+    resources: List[Dict],
+    wall_s: float
+) -> Dict:
+    errors: Dict[str, int] = {}
+    for record in records:
+        if record["error"]:
+            errors[record["error"]] = errors.get(record["error"], 0) + 1
+
+    # Per-window throughput/latency so saturation points are visible
+    windows: Dict[int, List[Dict]] = {}
+    for record in records:
+        windows.setdefault(int(record["t"] // args.window), []).append(record)
+    timeline = []
+    for window, bucket in sorted(windows.items()):
+        ok = sorted(r["latency_ms"] for r in bucket if not r["error"])
+        timeline.append({
+            "t": window * args.window,
+            "qps": round(len(bucket) / args.window, 2),
+            "error_rate": round(sum(1 for r in bucket if r["error"]) / len(bucket), 3),
+            "degraded_rate": round(sum(1 for r in bucket if r["degraded"]) / len(bucket), 3),
+            "p50_ms": ok[len(ok) // 2] if ok else None,
+            "p95_ms": ok[min(len(ok) - 1, int(0.95 * len(ok)))] if ok else None
+        })
+
+    total = len(records)
+    return {
+        "config": {key: value for key, value in vars(args).items()},
+        "requests": total,
+        "wall_s": round(wall_s, 1),
+        "achieved_qps": round(total / wall_s, 2) if wall_s else None,
+        "error_rate": round(sum(errors.values()) / total, 4) if total else None,
+        "degraded_rate": round(sum(1 for r in records if r["degraded"]) / total, 4) if total else None,
+        "errors": errors,
+        "latency_ms": latency.snapshot(),
+        "client_lag_ms": lag.snapshot(),
+        "timeline": timeline,
+        "resources": resources
+    }
+
+def print_summary(report: Dict) -> None:
+    latency = report["latency_ms"]
+    print(f"requests={report['requests']} achieved_qps={report['achieved_qps']} "
+          f"error_rate={report['error_rate']} degraded_rate={report['degraded_rate']}")
+    print(f"latency ms: p50<={latency['p50']} p95<={latency['p95']} p99<={latency['p99']} max={latency['max']}")
+    if report["errors"]:
+        print(f"errors: {report['errors']}")
+    print(f"\n{'t':>6} {'qps':>6} {'err':>6} {'p50':>8} {'p95':>8}")
+    for row in report["timeline"]:
+        print(f"{row['t']:>6} {row['qps']:>6} {row['error_rate']:>6} {str(row['p50_ms']):>8} {str(row['p95_ms']):>8}")
+    if report["resources"]:
+        peak_cpu = max(sample["cpu_percent"] for sample in report["resources"])
+        peak_rss = max(sample["rss_mb"] for sample in report["resources"])
+        print(f"\npeak cpu={peak_cpu}% peak rss={peak_rss} MB")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--log", default="benchmarks/queries.jsonl", help="JSONL with a 'query' field per line")
+    parser.add_argument("--target", default="pipeline", help="'pipeline' (in-process) or an API base URL")
+    parser.add_argument("--profile", choices=["constant", "ramp", "step"], default="constant")
+    parser.add_argument("--qps", type=float, default=2.0, help="start/constant rate")
+    parser.add_argument("--ramp-to", type=float, default=10.0, help="final rate for --profile ramp")
+    parser.add_argument("--step-qps", type=float, default=2.0, help="increment for --profile step")
+    parser.add_argument("--step-every", type=float, default=30.0, help="seconds per step")
+    parser.add_argument("--arrivals", choices=["poisson", "uniform"], default="poisson")
+    parser.add_argument("--duration", type=float, default=60.0)
+    parser.add_argument("--max-inflight", type=int, default=256, help="client threads")
+    parser.add_argument("--timeout", type=float, default=60.0, help="HTTP client timeout")
+    parser.add_argument("--window", type=float, default=5.0, help="timeline bucket seconds")
+    parser.add_argument("--sample-interval", type=float, default=1.0, help="CPU/RSS sampling seconds")
+    parser.add_argument("--pid", type=int, help="process to sample (default: this one)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="write the full JSON report here")
+    parser.add_argument("--stub", action="store_true", help="replace Groq with benchmarks.groq_stub")
+    parser.add_argument("--catalog", default="data/anime_with_synopsis.csv")
+    parser.add_argument("--stub-latency-ms", type=float, default=800.0)
+    parser.add_argument("--stub-latency-sigma", type=float, default=0.5)
+    parser.add_argument("--stub-error-rate", type=float, default=0.0)
+    parser.add_argument("--stub-truncate-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    report = run(args)
+    print_summary(report)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -9,8 +9,9 @@ class Config:
     """
     Secure configuration manager with validation
     """
-    # Model Constants
-    GROQ_MODEL = "mixtral-8x7b-32768"
+    # Model Constants (same env vars and defaults as AnimeRecommender/ModelRouter)
+    GROQ_MODEL = os.getenv("GROQ_MODEL", "llama3-70b-8192")
+    GROQ_FAST_MODEL = os.getenv("GROQ_FAST_MODEL", "llama3-8b-8192")
     EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
 
     @staticmethod
@@ -0,0 +1,23 @@
+import multiprocessing
+import os
+
+# Gunicorn settings for the recommendation API (app/api.py).
+# Run with: gunicorn app.api:app -c gunicorn.conf.py
+
+bind = os.getenv("API_BIND", "0.0.0.0:8000")
+
+# The pipeline is loaded in the master before forking so workers share the
+# read-only indexes copy-on-write instead of each building their own copy.
+preload_app = True
+
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = int(os.getenv("WEB_CONCURRENCY", min(multiprocessing.cpu_count() * 2 + 1, 8)))
+
+# LLM calls are slow; keep the worker timeout above the recommender's
+# retry budget so gunicorn does not kill healthy workers mid-request.
+timeout = int(os.getenv("API_WORKER_TIMEOUT", 90))
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = "-"
+errorlog = "-"
@@ -1,8 +1,12 @@
 import time
 from pathlib import Path
-from typing import Any  # Add this import at the top
+from typing import Any, Callable, List  # Add this import at the top
 from src.data_loader import AnimeDataLoader
 from src.vector_store import VectorStoreBuilder
+from src.catalog import AnimeCatalog
+from src.similarity_graph import SimilarityGraph
+from src.title_embeddings import TitleEmbeddings
+from src.autocomplete import AutocompleteIndex
 from utils.logger import get_logger
 from utils.custom_exception import CustomException, ConfigError
 from config.config import Config
@@ -17,7 +21,11 @@ class PipelineBuilder:
         persist_dir: str = "chroma_db",
         chunk_size: int = 800,
         chunk_overlap: int = 100,
-        max_retries: int = 2
+        max_retries: int = 2,
+        similarity_graph_path: str = "data/similarity_graph.npz",
+        similarity_top_n: int = 20,
+        title_embeddings_path: str = "data/title_embeddings.npz",
+        autocomplete_path: str = "data/autocomplete_index.json"
     ):
         if not Config.validate():
             raise ConfigError("Invalid API configuration")
@@ -28,6 +36,10 @@ class PipelineBuilder:
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
         self.max_retries = max_retries
+        self.similarity_graph_path = similarity_graph_path
+        self.similarity_top_n = similarity_top_n
+        self.title_embeddings_path = title_embeddings_path
+        self.autocomplete_path = autocomplete_path
         self._setup_workspace()
 
     def _setup_workspace(self):
@@ -44,12 +56,33 @@ class PipelineBuilder:
             # Build vector store
             self._build_vector_store(processed_path)
 
+            # Precompute "more like this" neighbours and per-title embeddings
+            self._build_optional(
+                lambda: self._build_similarity_graph(processed_path),
+                [self.similarity_graph_path, self.title_embeddings_path],
+                "similarity graph"
+            )
+
+            # Type-ahead index over titles and genres
+            self._build_optional(self._build_autocomplete_index, [self.autocomplete_path], "autocomplete index")
+
             logger.info("✅ Pipeline completed successfully")
         except Exception as e:
             logger.error("❌ Pipeline failed - cleaning up...")
             self._cleanup()
             raise CustomException("Pipeline execution failed", e)
 
+    def _build_optional(self, build: Callable[[], None], artifacts: List[str], name: str) -> None:
+        """
+        Build an index the app can serve without. A failure removes only that
+        index's files and keeps the processed data and vector store.
+        """
+        try:
+            build()
+        except Exception as e:
+            logger.error(f"⚠️ {name} failed, continuing without it: {str(e)}")
+            self._remove(artifacts)
+
     def _process_data(self) -> str:
         """Process raw data with retries"""
         return self._run_with_retry(
@@ -72,6 +105,43 @@ class PipelineBuilder:
             operation_name="vector store creation"
         )
 
+    def _build_similarity_graph(self, processed_path: str) -> None:
+        """Build item-to-item similarity graph with retries"""
+        self._run_with_retry(
+            operation=lambda: self._compute_similarity_graph(processed_path),
+            operation_name="similarity graph"
+        )
+
+    def _compute_similarity_graph(self, processed_path: str) -> None:
+        """Average chunk embeddings per title, then top-N neighbours by cosine"""
+        rows, embeddings = VectorStoreBuilder(
+            csv_path=processed_path,
+            persist_dir=self.persist_dir
+        ).load_row_embeddings()
+        catalog = AnimeCatalog(self.raw_data_path)
+
+        # CSVLoader rows are offset by one: row 0 is the processed CSV header
+        positions = rows - 1
+        keep = (positions >= 0) & (positions < len(catalog))
+        mal_ids = catalog.df["mal_id"].to_numpy()[positions[keep]]
+
+        SimilarityGraph.build(
+            embeddings[keep],
+            mal_ids,
+            top_n=self.similarity_top_n
+        ).save(self.similarity_graph_path)
+        # Kept for serve-time reranking of session candidate pools
+        TitleEmbeddings(mal_ids, embeddings[keep]).save(self.title_embeddings_path)
+
+    def _build_autocomplete_index(self) -> None:
+        """Build and persist the title/genre prefix index"""
+        self._run_with_retry(
+            operation=lambda: AutocompleteIndex.build(
+                AnimeCatalog(self.raw_data_path)
+            ).save(self.autocomplete_path),
+            operation_name="autocomplete index"
+        )
+
     def _run_with_retry(self, operation: callable, operation_name: str) -> Any:
         """Execute operation with retry logic"""
         last_exception = None
@@ -86,17 +156,28 @@ class PipelineBuilder:
                     time.sleep(wait)
         raise last_exception
 
-    def _cleanup(self):
-        """Clean up partial outputs"""
+    def _remove(self, paths: List[str]) -> None:
+        """Delete output files/directories that exist"""
         try:
-            if Path(self.processed_data_path).exists():
-                Path(self.processed_data_path).unlink()
-            if Path(self.persist_dir).exists():
-                import shutil
-                shutil.rmtree(self.persist_dir)
+            for path in map(Path, paths):
+                if path.is_dir():
+                    import shutil
+                    shutil.rmtree(path)
+                elif path.exists():
+                    path.unlink()
         except Exception as e:
             logger.error(f"Cleanup failed: {str(e)}")
 
+    def _cleanup(self):
+        """Clean up partial outputs"""
+        self._remove([
+            self.processed_data_path,
+            self.similarity_graph_path,
+            self.title_embeddings_path,
+            self.autocomplete_path,
+            self.persist_dir
+        ])
+
 def main():
     try:
         logger.info("🚀 Starting pipeline build")
@@ -1,9 +1,21 @@
-from typing import List, Dict
+import os
+from typing import List, Dict, Optional, Union
 from src.recommender import AnimeRecommender
+from src.catalog import AnimeCatalog
+from src.fallback import CatalogFallback
+from src.title_index import TitleIndex
+from src.similarity_graph import SimilarityGraph
+from src.autocomplete import AutocompleteIndex
+from src.title_embeddings import TitleEmbeddings
+from src.session import ResultSession
 from utils.custom_exception import RecommendationError
+from utils.resilience import Deadline
+from utils.profiling import profiler
 from utils.logger import logger
 
 class AnimePipeline:
+    FALLBACK_RESERVE_SHARE = 0.2
+
     def __init__(self):
         try:
             self.recommender = AnimeRecommender()
@@ -14,22 +26,315 @@ class AnimePipeline:
                 error_detail=e
             )
 
-    def recommend(self, query: str) -> List[Dict]:
+        # End-to-end budget per request, and the slice of it kept for the fallback
+        # (at most FALLBACK_RESERVE_SHARE of a short budget, so the LLM still gets most of it)
+        self.deadline_s = float(os.getenv("RECOMMEND_DEADLINE_S", 12))
+        self.fallback_reserve_s = float(os.getenv("FALLBACK_RESERVE_S", 1.0))
+        # Catalog snippets added to the prompt; 0 keeps the prompt free-form
+        self.prompt_context_items = int(os.getenv("PROMPT_CONTEXT_ITEMS", 0))
+        self.catalog = self._load_catalog()
+        self.fallback = self._init_fallback(self.catalog) if self.catalog else None
+        self.title_index = TitleIndex(self.catalog) if self.catalog else None
+        self._genres_lc = {
+            genre.lower(): genre for record in self.catalog.records for genre in record["genres"]
+        } if self.catalog else {}
+        self.similarity_graph = self._load_similarity_graph()
+        self.title_embeddings = self._load_title_embeddings()
+        # Candidates kept per search for local refinement, and the MMR diversity trade-off
+        self.session_pool_size = int(os.getenv("SESSION_POOL_SIZE", 40))
+        self.session_diversity = float(os.getenv("SESSION_DIVERSITY", 0.3))
+        self.autocomplete = self._load_autocomplete()
+
+    def _load_catalog(self) -> Optional[AnimeCatalog]:
+        try:
+            return AnimeCatalog(os.getenv("CATALOG_PATH", "data/anime_with_synopsis.csv"))
+        except Exception as e:
+            logger.warning(f"Catalog unavailable, degraded mode and grounding disabled: {str(e)}")
+            return None
+
+    def _load_similarity_graph(self) -> Optional[SimilarityGraph]:
+        path = os.getenv("SIMILARITY_GRAPH_PATH", "data/similarity_graph.npz")
+        if self.catalog is None or not os.path.exists(path):
+            logger.warning(f"Similarity graph not found at {path}, 'more like this' disabled")
+            return None
+        try:
+            return SimilarityGraph.load(path)
+        except Exception as e:
+            logger.warning(f"Similarity graph unavailable: {str(e)}")
+            return None
+
+    def _load_title_embeddings(self) -> Optional[TitleEmbeddings]:
+        path = os.getenv("TITLE_EMBEDDINGS_PATH", "data/title_embeddings.npz")
+        if self.catalog is None or not os.path.exists(path):
+            logger.warning(f"Title embeddings not found at {path}, session reranking uses genre overlap")
+            return None
+        try:
+            return TitleEmbeddings.load(path)
+        except Exception as e:
+            logger.warning(f"Title embeddings unavailable: {str(e)}")
+            return None
+
+    def _load_autocomplete(self) -> Optional[AutocompleteIndex]:
+        if self.catalog is None:
+            return None
+        path = os.getenv("AUTOCOMPLETE_PATH", "data/autocomplete_index.json")
+        try:
+            return AutocompleteIndex.load_or_build(path, self.catalog)
+        except Exception as e:
+            logger.warning(f"Autocomplete index at {path} unusable, rebuilding from the catalog: {str(e)}")
+        try:
+            return AutocompleteIndex.build(self.catalog)
+        except Exception as e:
+            logger.warning(f"Autocomplete unavailable: {str(e)}")
+            return None
+
+    def _init_fallback(self, catalog: AnimeCatalog) -> CatalogFallback:
+        """Local catalog (and optionally vector store) used in degraded mode"""
+        vector_store = None
+        if os.getenv("FALLBACK_VECTOR_STORE", "0") == "1":
+            try:
+                from src.vector_store import VectorStoreBuilder
+                vector_store = VectorStoreBuilder(
+                    csv_path="data/anime_processed.csv",
+                    persist_dir=os.getenv("CHROMA_DIR", "chroma_db")
+                ).load_vector_store(micro_batch=os.getenv("EMBED_MICRO_BATCH", "1") == "1")
+            except Exception as e:
+                logger.warning(f"Vector store unavailable, keyword fallback only: {str(e)}")
+        return CatalogFallback(catalog, vector_store)
+
+    def recommend(
+        self,
+        query: str,
+        deadline_s: Optional[float] = None,
+        n_items: int = 5,
+        exclude: Optional[List[str]] = None
+    ) -> List[Dict]:
+        with profiler.request("recommend"):
+            return self._recommend(query, deadline_s, n_items, exclude)
+
+    def _recommend(
+        self,
+        query: str,
+        deadline_s: Optional[float],
+        n_items: int,
+        exclude: Optional[List[str]]
+    ) -> List[Dict]:
+        deadline = Deadline(deadline_s or self.deadline_s)
         try:
             logger.info(f"Processing query: '{query}'")
-            results = self.recommender.get_recommendations(query)
+            context = None
+            if self.prompt_context_items and self.fallback is not None:
+                with profiler.span("context_snippets"):
+                    context = self.fallback.context_snippets(query, self.prompt_context_items)
+            reserve = min(self.fallback_reserve_s, deadline.budget_s * self.FALLBACK_RESERVE_SHARE)
+            results = self.recommender.get_recommendations(
+                query,
+                deadline=deadline.reserve(reserve),
+                n_items=n_items,
+                context=context,
+                exclude=exclude
+            )
 
             if not results:
                 logger.warning("No recommendations generated")
                 return []
 
+            if self.title_index is not None:
+                with profiler.span("grounding"):
+                    self.title_index.enrich(results)
+
             logger.info(f"Generated {len(results)} recommendations")
             return results
 
         except Exception as e:
             logger.error(f"Pipeline error: {str(e)}")
+            if self.fallback is not None:
+                try:
+                    with profiler.span("fallback"):
+                        results = self.fallback.recommend(query, limit=n_items, deadline=deadline)
+                    logger.warning(f"Served {len(results)} degraded recommendations from catalog")
+                    return results
+                except Exception as fallback_error:
+                    logger.error(f"Fallback failed: {str(fallback_error)}")
             raise RecommendationError(
                 message="Failed to generate recommendations",
                 query=query,
                 error_detail=e
-            )
\ No newline at end of file
+            )
+
+    def more_like_this(self, title_or_id: Union[str, int], limit: int = 5) -> List[Dict]:
+        """Nearest catalog titles from the precomputed graph - no LLM call"""
+        if self.similarity_graph is None:
+            raise RecommendationError(message="Similarity graph not loaded")
+
+        if isinstance(title_or_id, int):
+            source = self.catalog.get_by_mal_id(title_or_id)
+        else:
+            source = self.title_index.lookup(title_or_id)
+        if source is None:
+            return []
+
+        results = []
+        for mal_id, score in self.similarity_graph.neighbours_of(source['mal_id'], limit):
+            record = self.catalog.get_by_mal_id(mal_id)
+            if record is None:
+                # Graph built from an older catalog
+                continue
+            results.append(self.catalog.to_recommendation(
+                record,
+                match_score=max(1, min(100, round(score * 100))),
+                why=f"Similar to {source['name']}",
+                source='similarity'
+            ))
+        return results
+
+    def suggest(self, text: str, limit: int = 8) -> List[Dict]:
+        """Type-ahead suggestions for titles and genres"""
+        return self.autocomplete.suggest(text, limit) if self.autocomplete else []
+
+    def match_suggestion(self, text: str) -> Optional[Dict]:
+        """The suggestion `text` names exactly, if any - lets callers skip the LLM"""
+        return self.autocomplete.exact(text) if self.autocomplete else None
+
+    def recommend_for_suggestion(self, kind: str, value: str, limit: int = 5) -> List[Dict]:
+        """
+        Fast catalog path for a selected suggestion: the title plus its
+        nearest neighbours, or the best-rated titles of a genre.
+        """
+        if self.catalog is None:
+            raise RecommendationError(message="Catalog not loaded, suggestions disabled")
+        if kind == "genre":
+            # Typed values arrive in any case: 'sci-fi' -> 'Sci-Fi'
+            genre = self._genres_lc.get(value.strip().lower())
+            if genre is None:
+                return []
+            df = self.catalog.df
+            in_genre = df[df["genres"].apply(lambda genres: genre in genres)]
+            top = in_genre.sort_values("score", ascending=False).head(limit)
+            return [
+                self.catalog.to_recommendation(
+                    self.catalog.get(position),
+                    match_score=90,
+                    why=f"Top-rated {genre} anime",
+                    source='genre'
+                )
+                for position in top.index
+            ]
+
+        record = self.title_index.lookup(value) if self.title_index else None
+        if record is None:
+            return []
+        selected = self.catalog.to_recommendation(record, 100, "Your selection", source='selection')
+        if self.similarity_graph is None:
+            return [selected]
+        return [selected] + self.more_like_this(record['mal_id'], limit - 1)
+
+    def embedding_stats(self) -> Optional[Dict]:
+        """Batch-size and queue-wait histograms of the query embedder, if batching"""
+        vector_store = self.fallback.vector_store if self.fallback else None
+        embedder = getattr(vector_store, 'embeddings', None)
+        return embedder.stats() if hasattr(embedder, 'stats') else None
+
+    def _expand_pool(self, query: str, results: List[Dict]) -> List[Dict]:
+        """
+        Over-fetch locally around the LLM's picks: graph neighbours of each
+        grounded result and catalog matches for the query. No extra LLM call.
+        """
+        pool = list(results)
+        if self.similarity_graph is not None:
+            per_result = max(1, self.session_pool_size // max(1, len(results)))
+            for rec in results:
+                if rec.get('mal_id') is None:
+                    continue
+                for mal_id, score in self.similarity_graph.neighbours_of(rec['mal_id'], per_result):
+                    record = self.catalog.get_by_mal_id(mal_id)
+                    if record is not None:
+                        pool.append(self.catalog.to_recommendation(
+                            record,
+                            # Neighbours rank below the pick they came from
+                            match_score=max(1, round(rec['match_score'] * float(score))),
+                            why=f"Similar to {rec['anime']}",
+                            source='similarity'
+                        ))
+        if self.fallback is not None:
+            try:
+                pool += self.fallback.recommend(query, limit=self.session_pool_size // 2)
+            except Exception as e:
+                logger.warning(f"Catalog candidates unavailable for session pool: {str(e)}")
+        return pool
+
+    def _new_session(self, query: str, page_size: int) -> ResultSession:
+        if self.catalog is None:
+            raise RecommendationError(message="Catalog not loaded, sessions disabled")
+        return ResultSession(query, self.catalog, self.title_embeddings, page_size, self.session_diversity)
+
+    def _session_page(self, session: ResultSession, page: int) -> List[Dict]:
+        """
+        A page of the reranked pool. Only when the pool can't fill it is the
+        LLM asked for more, with the refinements in the query and the pool's
+        best titles excluded.
+        """
+        room = ResultSession.MAX_CANDIDATES - len(session.candidates) > 2 * self.session_pool_size
+        if not session.has_page(page) and room:
+            known = [session.candidates[i]['anime'] for i in session.ranking()]
+            try:
+                fresh = self.recommend(session.describe(), n_items=session.page_size, exclude=known[:25])
+                added = session.add(self._expand_pool(session.query, fresh))
+                logger.info(f"Session pool exhausted at page {page}, LLM top-up added {added} candidates")
+            except RecommendationError as e:
+                logger.warning(f"Session top-up failed, serving what the pool has: {str(e)}")
+        return session.results(page)
+
+    def _session_view(self, session: ResultSession, page: int, notes: List[str]) -> Dict:
+        recommendations = self._session_page(session, page)
+        return {
+            "session": session.to_dict(),
+            "recommendations": recommendations,
+            "page": page,
+            "has_next": session.has_page(page + 1),
+            "notes": notes
+        }
+
+    def start_session(self, query: str, page_size: int = 5) -> Dict:
+        """
+        Recommend, then keep an over-fetched candidate pool for local
+        refinement. The returned `session` state is passed back to
+        `refine_session`, so nothing is held server-side.
+        """
+        session = self._new_session(query, page_size)
+        results = self.recommend(query, n_items=page_size)
+        session.add(self._expand_pool(query, results))
+        logger.info(f"Session for '{query}' started with {len(session.candidates)} candidates")
+        return self._session_view(session, 0, [])
+
+    def refine_session(
+        self,
+        state: Dict,
+        text: Optional[str] = None,
+        include: Optional[List[str]] = None,
+        exclude: Optional[List[str]] = None,
+        min_score: Optional[float] = None,
+        page: int = 0
+    ) -> Dict:
+        """
+        Rerank a session's pool with new filters and/or a free-text refinement
+        ('less violent', 'no mecha', 'more like Cowboy Bebop') and return a page.
+        Raises ValueError for malformed state.
+        """
+        if self.catalog is None:
+            raise RecommendationError(message="Catalog not loaded, sessions disabled")
+        session = ResultSession.from_dict(state, self.catalog, self.title_embeddings, self.session_diversity)
+        # Filters first: they mirror the current state, and the text adds to it
+        session.set_filters(include, exclude, min_score)
+        notes = []
+        if text and text.strip():
+            notes = session.apply(text, self.title_index.lookup if self.title_index else None)
+        return self._session_view(session, page, notes)
+
+    def followup_questions(self, recommendations: List[Dict]) -> List[str]:
+        """Questions that help the user refine, or none if the LLM is unavailable"""
+        try:
+            return self.recommender.followup_questions(recommendations)
+        except Exception as e:
+            logger.warning(f"Follow-up questions unavailable: {str(e)}")
+            return []
@@ -0,0 +1,123 @@
+import bisect
+import json
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from src.catalog import AnimeCatalog
+from src.title_index import normalize_title
+from utils.custom_exception import CustomException
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+class AutocompleteIndex:
+    """
+    Type-ahead over catalog titles and genres.
+
+    A sorted array of normalized keys searched with binary search. Every
+    word-suffix of a title is a key, so 'bebop' finds 'Cowboy Bebop'.
+    Results are ranked by MAL score (genres by their best title's score,
+    shown ahead of titles). Prefixes of one or two characters match too many
+    keys to scan, so their top results are precomputed; a larger `limit`
+    falls back to the scan.
+    """
+
+    SHORT_PREFIX_LEN = 2
+    SHORT_PREFIX_TOP = 20
+
+    def __init__(self, entries: List[Dict], keys: List[str], key_entries: List[int]):
+        self.entries = entries
+        self.keys = keys
+        self.key_entries = key_entries
+        self._exact: Dict[str, int] = {}
+        for key, entry_id in zip(keys, key_entries):
+            if key == normalize_title(entries[entry_id]["value"]):
+                self._exact.setdefault(key, entry_id)
+        self._short: Dict[str, List[int]] = self._precompute_short_prefixes()
+        self._by_score = sorted(range(len(entries)), key=self._rank)
+
+    @classmethod
+    def build(cls, catalog: AnimeCatalog) -> "AutocompleteIndex":
+        entries: List[Dict] = []
+        genre_best: Dict[str, float] = {}
+        for record in catalog.records:
+            entries.append({
+                "kind": "title",
+                "value": record["name"],
+                "score": float(record["score"]),
+                "mal_id": int(record["mal_id"])
+            })
+            for genre in record["genres"]:
+                genre_best[genre] = max(genre_best.get(genre, 0.0), float(record["score"]))
+
+        for genre, best in genre_best.items():
+            entries.append({"kind": "genre", "value": genre, "score": best, "mal_id": None})
+
+        pairs = []
+        for entry_id, entry in enumerate(entries):
+            words = normalize_title(entry["value"]).split()
+            for start in range(len(words)):
+                pairs.append((" ".join(words[start:]), entry_id))
+        pairs.sort()
+
+        logger.info(f"Autocomplete index built: {len(pairs)} keys for {len(entries)} entries")
+        return cls(entries, [key for key, _ in pairs], [entry_id for _, entry_id in pairs])
+
+    def save(self, path: str) -> None:
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({
+                    "entries": self.entries,
+                    "keys": self.keys,
+                    "key_entries": self.key_entries
+                }, f, ensure_ascii=False)
+            logger.info(f"Autocomplete index saved to {path}")
+        except Exception as e:
+            raise CustomException("Failed to save autocomplete index", e, {"path": path})
+
+    @classmethod
+    def load(cls, path: str) -> "AutocompleteIndex":
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            return cls(data["entries"], data["keys"], data["key_entries"])
+        except Exception as e:
+            raise CustomException("Failed to load autocomplete index", e, {"path": path})
+
+    @classmethod
+    def load_or_build(cls, path: str, catalog: AnimeCatalog) -> "AutocompleteIndex":
+        if Path(path).exists():
+            return cls.load(path)
+        return cls.build(catalog)
+
+    def _rank(self, entry_id: int) -> Tuple[int, float]:
+        """Sort key: genres ahead of titles, then higher score first"""
+        entry = self.entries[entry_id]
+        return (entry["kind"] != "genre", -entry["score"])
+
+    def _scan(self, prefix: str) -> List[int]:
+        """Entry ids whose keys start with `prefix`, best score first, deduplicated"""
+        found = set()
+        position = bisect.bisect_left(self.keys, prefix)
+        while position < len(self.keys) and self.keys[position].startswith(prefix):
+            found.add(self.key_entries[position])
+            position += 1
+        return sorted(found, key=self._rank)
+
+    def _precompute_short_prefixes(self) -> Dict[str, List[int]]:
+        prefixes = {key[:length] for key in self.keys for length in range(1, self.SHORT_PREFIX_LEN + 1)}
+        return {prefix: self._scan(prefix)[:self.SHORT_PREFIX_TOP] for prefix in prefixes}
+
+    def suggest(self, text: str, limit: int = 8) -> List[Dict]:
+        prefix = normalize_title(text)
+        if not prefix:
+            ranked = self._by_score
+        elif len(prefix) <= self.SHORT_PREFIX_LEN and limit <= self.SHORT_PREFIX_TOP:
+            ranked = self._short.get(prefix, [])
+        else:
+            ranked = self._scan(prefix)
+        return [self.entries[entry_id] for entry_id in ranked[:limit]]
+
+    def exact(self, text: str) -> Optional[Dict]:
+        """The entry whose full name is `text` (normalized), e.g. a typed known title"""
+        entry_id = self._exact.get(normalize_title(text))
+        return None if entry_id is None else self.entries[entry_id]
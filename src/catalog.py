@@ -0,0 +1,93 @@
+import re
+import pandas as pd
+from typing import Dict, List, Optional
+from src.data_loader import AnimeDataLoader
+from utils.custom_exception import CustomException
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+class AnimeCatalog:
+    """
+    Read-only, in-memory view of the raw anime dataset.
+
+    Loaded once per process and shared by the serve-time components
+    (fallback search, title matching, similarity lookups).
+    """
+
+    SYNOPSIS_SENTENCES = 2
+
+    def __init__(self, csv_path: str = "data/anime_with_synopsis.csv"):
+        self.csv_path = csv_path
+        self.df = self._load()
+        self.records: List[Dict] = self.df.to_dict("records")
+        self._by_mal_id: Dict[int, int] = {
+            record["mal_id"]: position for position, record in enumerate(self.records)
+        }
+        logger.info(f"Catalog loaded with {len(self.records)} titles")
+
+    def _load(self) -> pd.DataFrame:
+        """Load the raw CSV and normalize it into typed columns"""
+        try:
+            df = pd.read_csv(self.csv_path, encoding="utf-8", on_bad_lines="warn")
+            df.columns = df.columns.str.strip().str.replace("\ufeff", "", regex=False).str.lower()
+            df = df.rename(columns=AnimeDataLoader.COMMON_TYPO_MAPPING)
+
+            missing = AnimeDataLoader.REQUIRED_COLUMNS - set(df.columns)
+            if missing:
+                raise ValueError(f"Missing required columns: {missing}")
+
+            # Rows are never dropped: positions must line up with the
+            # processed CSV the vector store was built from
+            df["name"] = df["name"].fillna("").str.strip()
+            df["mal_id"] = (
+                pd.to_numeric(df["mal_id"], errors="coerce").fillna(-1).astype(int)
+                if "mal_id" in df.columns else df.index.astype(int)
+            )
+            df["score"] = (
+                pd.to_numeric(df["score"], errors="coerce").fillna(0.0)
+                if "score" in df.columns else 0.0
+            )
+            df["synopsis"] = df["synopsis"].fillna("").str.strip()
+            df["genres"] = df["genres"].fillna("").apply(
+                lambda value: [genre.strip() for genre in value.split(",") if genre.strip()]
+            )
+            # Lower-cased search columns, computed once for vectorized matching
+            df["_name_lc"] = df["name"].str.lower()
+            df["_genres_lc"] = df["genres"].apply(lambda genres: " ".join(genres).lower())
+            df["_synopsis_lc"] = df["synopsis"].str.lower()
+            return df
+        except Exception as e:
+            raise CustomException("Failed to load anime catalog", e, {"path": self.csv_path})
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def get(self, position: int) -> Dict:
+        return self.records[position]
+
+    def get_by_mal_id(self, mal_id: int) -> Optional[Dict]:
+        position = self._by_mal_id.get(mal_id)
+        return None if position is None else self.records[position]
+
+    def position_of(self, mal_id: int) -> Optional[int]:
+        return self._by_mal_id.get(mal_id)
+
+    @classmethod
+    def short_synopsis(cls, synopsis: str) -> str:
+        """First couple of sentences, enough for a recommendation card"""
+        sentences = re.split(r"(?<=[.!?])\s+", synopsis)
+        return " ".join(sentences[:cls.SYNOPSIS_SENTENCES])
+
+    def to_recommendation(self, record: Dict, match_score: int, why: str, source: str = 'catalog') -> Dict:
+        """Shape a catalog row like an LLM recommendation"""
+        return {
+            'anime': record['name'],
+            'description': self.short_synopsis(record['synopsis']),
+            'match_score': match_score,
+            'genres': record['genres'],
+            'year': '',
+            'why': why,
+            'mal_id': record['mal_id'],
+            'source': source
+        }
@@ -0,0 +1,127 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Dict, List, Optional, Tuple
+from langchain_core.embeddings import Embeddings
+from utils.metrics import Histogram, LATENCY_MS_BUCKETS, BATCH_SIZE_BUCKETS
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+class MicroBatchEmbedder(Embeddings):
+    """
+    Coalesces concurrent `embed_query` calls into one forward pass.
+
+    The first query opens a window of `max_wait_ms`; everything that arrives
+    before it closes (or until `max_batch_size` is reached) is encoded with a
+    single `embed_documents` call and the vectors are handed back to the
+    waiting callers. While a batch is encoding, new queries queue up and form
+    the next batch, so under load the window rarely has to wait at all.
+    A caller that has waited `queue_timeout_s` (stuck or dead batch thread)
+    gives up its slot and encodes its query directly.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+        queue_timeout_s: float = 2.0
+    ):
+        self.embeddings = embeddings
+        self.max_batch_size = max_batch_size
+        self.max_wait_s = max_wait_ms / 1000
+        self.queue_timeout_s = queue_timeout_s
+        self.direct_fallbacks = 0
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_wait_ms = Histogram(LATENCY_MS_BUCKETS)
+        self.encode_ms = Histogram(LATENCY_MS_BUCKETS)
+        self._queue: "queue.Queue[Tuple[str, Future, float]]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._worker_pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, embeddings: Embeddings) -> "MicroBatchEmbedder":
+        return cls(
+            embeddings,
+            max_batch_size=int(os.getenv("EMBED_MAX_BATCH", 32)),
+            max_wait_ms=float(os.getenv("EMBED_MAX_WAIT_MS", 5)),
+            queue_timeout_s=float(os.getenv("EMBED_QUEUE_TIMEOUT_S", 2))
+        )
+
+    def _ensure_worker(self) -> None:
+        """Start the batching thread lazily and per process - threads do not survive a fork"""
+        with self._lock:
+            if self._worker is None or self._worker_pid != os.getpid() or not self._worker.is_alive():
+                self._queue = queue.Queue()
+                self._worker = threading.Thread(target=self._run, name="embed-batcher", daemon=True)
+                self._worker_pid = os.getpid()
+                self._worker.start()
+
+    def embed_query(self, text: str) -> List[float]:
+        self._ensure_worker()
+        future: Future = Future()
+        self._queue.put((text, future, time.monotonic()))
+        try:
+            return future.result(timeout=self.queue_timeout_s)
+        except FutureTimeoutError:
+            # Drop out of the batch if it hasn't started; either way don't wait any longer
+            future.cancel()
+            with self._lock:
+                self.direct_fallbacks += 1
+            logger.warning(f"Embedding batch not done after {self.queue_timeout_s}s, encoding directly")
+            return self.embeddings.embed_query(text)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Bulk calls are already batched - pass straight through"""
+        return self.embeddings.embed_documents(texts)
+
+    def _collect(self) -> List[Tuple[str, Future, float]]:
+        batch = [self._queue.get()]
+        window_closes = time.monotonic() + self.max_wait_s
+        while len(batch) < self.max_batch_size:
+            remaining = window_closes - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            # Skip queries whose callers timed out and encoded them directly
+            batch = [item for item in self._collect() if item[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            started = time.monotonic()
+            for _, _, enqueued in batch:
+                self.queue_wait_ms.observe((started - enqueued) * 1000)
+            self.batch_sizes.observe(len(batch))
+
+            try:
+                vectors = self.embeddings.embed_documents([text for text, _, _ in batch])
+            except Exception as e:
+                logger.error(f"Embedding batch of {len(batch)} failed: {str(e)}")
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            self.encode_ms.observe((time.monotonic() - started) * 1000)
+            for (_, future, _), vector in zip(batch, vectors):
+                future.set_result(vector)
+
+    def stats(self) -> Dict:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_s * 1000,
+            "direct_fallbacks": self.direct_fallbacks,
+            "batch_size": self.batch_sizes.snapshot(),
+            "queue_wait_ms": self.queue_wait_ms.snapshot(),
+            "encode_ms": self.encode_ms.snapshot()
+        }
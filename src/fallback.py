@@ -0,0 +1,121 @@
+import re
+import pandas as pd
+from typing import Dict, List, Optional, Tuple
+from src.catalog import AnimeCatalog
+from utils.resilience import Deadline
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+class CatalogFallback:
+    """
+    Degraded-mode recommender that answers from local data only.
+
+    Used when the LLM is unavailable or the request is running out of time.
+    Prefers semantic search over the vector store when one is loaded and the
+    budget allows it, otherwise ranks catalog rows by keyword hits and score.
+    """
+
+    STOPWORDS = {
+        'anime', 'about', 'that', 'relates', 'with', 'the', 'and', 'for',
+        'like', 'some', 'show', 'shows', 'series', 'want', 'something'
+    }
+    # Weight of a query term found in each column
+    FIELD_WEIGHTS = {'_genres_lc': 3, '_name_lc': 2, '_synopsis_lc': 1}
+    # Below this budget the embedding + ANN lookup is not attempted
+    MIN_VECTOR_BUDGET_S = 0.5
+
+    def __init__(self, catalog: AnimeCatalog, vector_store=None):
+        self.catalog = catalog
+        self.vector_store = vector_store
+
+    def recommend(self, query: str, limit: int = 5, deadline: Optional[Deadline] = None) -> List[Dict]:
+        if self.vector_store is not None and (
+            deadline is None or deadline.remaining() >= self.MIN_VECTOR_BUDGET_S
+        ):
+            try:
+                results = self._vector_search(query, limit)
+                if results:
+                    return results
+            except Exception as e:
+                logger.warning(f"Vector fallback failed, using keyword search: {str(e)}")
+        return self._keyword_search(query, limit)
+
+    def _terms(self, query: str) -> List[str]:
+        words = re.findall(r"[a-z0-9][a-z0-9\-]+", query.lower())
+        return [word for word in words if len(word) > 2 and word not in self.STOPWORDS]
+
+    def _rank(self, query: str, limit: int) -> List[Tuple[int, int]]:
+        """(catalog position, weighted keyword hits) for the best keyword matches"""
+        df = self.catalog.df
+        terms = self._terms(query)
+        if not terms:
+            return []
+        hits = pd.Series(0, index=df.index)
+        for term in terms:
+            for column, weight in self.FIELD_WEIGHTS.items():
+                hits += df[column].str.contains(term, regex=False).astype(int) * weight
+
+        ranked = (
+            pd.DataFrame({'hits': hits, 'score': df['score']})
+            .query('hits > 0')
+            .sort_values(['hits', 'score'], ascending=False)
+            .head(limit)
+        )
+        return [(position, int(row.hits)) for position, row in ranked.iterrows()]
+
+    def _keyword_search(self, query: str, limit: int) -> List[Dict]:
+        ranked = self._rank(query, limit)
+        if ranked:
+            terms = ', '.join(self._terms(query))
+            top_hits = ranked[0][1]
+            return [
+                self.catalog.to_recommendation(
+                    self.catalog.get(position),
+                    match_score=60 + int(20 * hits / top_hits),
+                    why=f"Catalog match for: {terms}"
+                )
+                for position, hits in ranked
+            ]
+
+        # Nothing matched - offer the best-rated titles rather than nothing
+        top = self.catalog.df.sort_values('score', ascending=False).head(limit)
+        return [
+            self.catalog.to_recommendation(
+                self.catalog.get(position),
+                match_score=50,
+                why="Highly rated pick (no direct catalog match)"
+            )
+            for position in top.index
+        ]
+
+    def context_snippets(self, query: str, limit: int) -> List[str]:
+        """Short catalog entries to ground the LLM prompt, best match first"""
+        snippets = []
+        for position, _ in self._rank(query, limit):
+            record = self.catalog.get(position)
+            snippets.append(
+                f"{record['name']} [{', '.join(record['genres'])}]: "
+                f"{self.catalog.short_synopsis(record['synopsis'])}"
+            )
+        return snippets
+
+    def _vector_search(self, query: str, limit: int) -> List[Dict]:
+        """Semantic search over the Chroma store, mapped back to catalog rows"""
+        # Several chunks can belong to one title, so over-fetch and dedupe
+        docs = self.vector_store.similarity_search_with_relevance_scores(query, k=limit * 3)
+        results, seen = [], set()
+        for doc, relevance in docs:
+            # CSVLoader rows are offset by one: row 0 is the processed CSV header
+            position = doc.metadata.get('row', 0) - 1
+            if position < 0 or position >= len(self.catalog) or position in seen:
+                continue
+            seen.add(position)
+            results.append(self.catalog.to_recommendation(
+                self.catalog.get(position),
+                match_score=60 + int(20 * max(0.0, min(1.0, relevance))),
+                why="Semantically similar title from the local catalog"
+            ))
+            if len(results) == limit:
+                break
+        return results
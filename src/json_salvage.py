@@ -0,0 +1,157 @@
+import json
+from typing import Any, Dict, List, Tuple, Union
+
+try:
+    import orjson
+
+    def loads(data: Union[str, bytes]) -> Any:
+        """Fast JSON decode; orjson.JSONDecodeError subclasses json.JSONDecodeError"""
+        return orjson.loads(data)
+except ImportError:  # orjson is optional
+    def loads(data: Union[str, bytes]) -> Any:
+        return json.loads(data)
+
+_CLOSERS = {'{': '}', '[': ']'}
+
+def repair_truncated(fragment: str) -> str:
+    """
+    Best-effort close of a JSON document cut off mid-stream: terminate an open
+    string, drop a dangling comma or colon, and close open brackets.
+    The result may still be invalid (e.g. cut inside a key or a literal).
+    """
+    stack, in_string, escaped = [], False, False
+    for char in fragment:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in _CLOSERS:
+            stack.append(_CLOSERS[char])
+        elif char in '}]' and stack:
+            stack.pop()
+
+    repaired = fragment
+    if in_string:
+        # A dangling backslash would escape the closing quote
+        repaired = (repaired[:-1] if escaped else repaired) + '"'
+    repaired = repaired.rstrip()
+    if repaired.endswith(','):
+        repaired = repaired[:-1]
+    elif repaired.endswith(':'):
+        repaired += 'null'
+    return repaired + ''.join(reversed(stack))
+
+def complete_prefix(partial: str) -> str:
+    """
+    A cut-off object trimmed back to its last fully received key/value.
+    A value counts as received once it is followed by a comma or is a closed
+    string/array/object; a bare number or literal at the cut may itself be
+    cut ('"score": 9' from 95), so it is dropped along with its key.
+    """
+    depth, in_string, escaped = 0, False, False
+    boundary, after_colon, value_closed = 1, False, False
+    for i, char in enumerate(partial):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+                value_closed = depth == 1 and after_colon
+            continue
+        if char == '"':
+            in_string = True
+        elif char in '{[':
+            depth += 1
+        elif char in '}]':
+            depth -= 1
+            value_closed = depth == 1
+        elif depth == 1 and char == ',':
+            boundary, after_colon, value_closed = i, False, False
+        elif depth == 1 and char == ':':
+            after_colon = True
+        elif not char.isspace():
+            value_closed = False
+    if value_closed and not in_string:
+        return partial
+    return partial[:boundary]
+
+def _array_start(text: str, key: str) -> int:
+    """Index just past the '[' that opens `key`'s array (or the first array)"""
+    key_at = text.find(f'"{key}"')
+    start = text.find('[', key_at if key_at >= 0 else 0)
+    return -1 if start < 0 else start + 1
+
+def extract_objects(text: str, key: str = "recommendations") -> Tuple[List[Dict], str]:
+    """
+    Scan the array under `key` and decode every complete top-level object.
+    Returns (objects, trailing partial object text or '').
+    """
+    start = _array_start(text, key)
+    if start < 0:
+        return [], ''
+
+    objects: List[Dict] = []
+    depth, in_string, escaped, object_start = 0, False, False, -1
+    for i in range(start, len(text)):
+        char = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char == '"':
+            in_string = True
+        elif char in '{[':
+            if depth == 0 and char == '{':
+                object_start = i
+            depth += 1
+        elif char in '}]':
+            if depth == 0:
+                # End of the recommendations array
+                return objects, ''
+            depth -= 1
+            if depth == 0 and object_start >= 0:
+                try:
+                    objects.append(loads(text[object_start:i + 1]))
+                except ValueError:
+                    pass
+                object_start = -1
+
+    partial = text[object_start:] if depth > 0 and object_start >= 0 else ''
+    return objects, partial
+
+def salvage_recommendations(text: str, key: str = "recommendations") -> Tuple[List[Dict], bool]:
+    """
+    Decode an LLM response as leniently as possible.
+    Returns (items, complete); `complete` is False when anything was repaired.
+    """
+    if not isinstance(text, str):
+        return [], False
+    try:
+        data = loads(text)
+        if isinstance(data, dict) and isinstance(data.get(key), list):
+            return data[key], True
+        if isinstance(data, list):
+            return data, True
+    except ValueError:
+        pass
+
+    objects, partial = extract_objects(text, key)
+    if partial:
+        try:
+            repaired = loads(repair_truncated(complete_prefix(partial)))
+            if isinstance(repaired, dict) and repaired:
+                objects.append(repaired)
+        except ValueError:
+            pass
+    return objects, False
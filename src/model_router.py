@@ -0,0 +1,272 @@
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+from utils.custom_exception import RecommendationError, DeadlineExceededError
+from utils.resilience import Deadline
+from utils.profiling import profiler
+from utils.logger import logger
+
+class ModelStats:
+    """Rolling latency window and outcome counters for one model"""
+
+    def __init__(self, window: int = 200):
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.requests = 0
+        self.successes = 0
+        self.errors = 0
+        self.invalid = 0
+        self.items = 0
+        self.hedges_launched = 0
+        self.hedge_wins = 0
+        self.abandoned = 0
+
+    def record(self, latency_s: float, outcome: str, items: int = 0) -> None:
+        self.requests += 1
+        if outcome == "ok":
+            self.successes += 1
+            self.items += items
+            # Only completed calls say anything about how fast the model answers
+            self.latencies.append(latency_s)
+        elif outcome == "invalid":
+            self.invalid += 1
+            self.latencies.append(latency_s)
+        else:
+            self.errors += 1
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def snapshot(self) -> Dict:
+        def ms(value: Optional[float]) -> Optional[float]:
+            return None if value is None else round(value * 1000, 1)
+
+        return {
+            "requests": self.requests,
+            "success_rate": round(self.successes / self.requests, 3) if self.requests else None,
+            "valid_json_rate": (
+                round(self.successes / (self.successes + self.invalid), 3)
+                if self.successes + self.invalid else None
+            ),
+            "avg_items": round(self.items / self.successes, 2) if self.successes else None,
+            "p50_ms": ms(self.percentile(0.50)),
+            "p95_ms": ms(self.percentile(0.95)),
+            "p99_ms": ms(self.percentile(0.99)),
+            "hedges_launched": self.hedges_launched,
+            "hedge_wins": self.hedge_wins,
+            "abandoned": self.abandoned
+        }
+
+class ModelRouter:
+    """
+    Chooses which Groq model serves a query and hedges slow calls.
+
+    - Simple single-genre queries go to the cheaper `fast_model` by default.
+    - If the chosen model has not answered after its observed p95 latency,
+      a second request is sent to the other model; the first valid answer
+      wins and the other call is abandoned (its result is discarded).
+    - Hedges are skipped while the pool is backlogged (a second call would
+      only queue behind the first) and capped at `max_hedge_rate` of calls.
+    - Every call runs on the router's pool so the caller stops waiting at
+      the deadline, however slowly the response arrives.
+    """
+    # Most hedges that can be saved up while traffic is quiet
+    HEDGE_BURST = 3.0
+
+    def __init__(
+        self,
+        primary_model: str,
+        fast_model: Optional[str] = None,
+        hedge_enabled: bool = True,
+        hedge_percentile: float = 0.95,
+        hedge_min_s: float = 1.0,
+        hedge_max_s: float = 8.0,
+        default_hedge_delay_s: float = 3.0,
+        min_samples: int = 20,
+        max_workers: int = 16,
+        max_hedge_rate: float = 0.1,
+        busy_fraction: float = 0.75
+    ):
+        self.primary_model = primary_model
+        self.fast_model = fast_model if fast_model and fast_model != primary_model else None
+        self.hedge_enabled = hedge_enabled and self.fast_model is not None
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_s = hedge_min_s
+        self.hedge_max_s = hedge_max_s
+        self.default_hedge_delay_s = default_hedge_delay_s
+        self.min_samples = min_samples
+        self.max_workers = max_workers
+        self.max_hedge_rate = max_hedge_rate
+        # Calls in flight (running or queued) at which the pool counts as backlogged
+        self.busy_threshold = max(1, int(max_workers * busy_fraction))
+        self._inflight = 0
+        # Each call earns `max_hedge_rate` of a hedge; a hedge spends 1 (token bucket)
+        self._hedge_credit = 1.0
+        self._stats: Dict[str, ModelStats] = {
+            model: ModelStats() for model in filter(None, [self.primary_model, self.fast_model])
+        }
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_pid: Optional[int] = None
+
+    @classmethod
+    def from_env(cls, primary_model: str) -> "ModelRouter":
+        return cls(
+            primary_model=primary_model,
+            fast_model=os.getenv("GROQ_FAST_MODEL", "llama3-8b-8192"),
+            hedge_enabled=os.getenv("HEDGE_ENABLED", "1") == "1",
+            default_hedge_delay_s=float(os.getenv("HEDGE_DELAY_S", 3.0)),
+            max_hedge_rate=float(os.getenv("HEDGE_MAX_RATE", 0.1))
+        )
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Create the pool lazily and per process - threads do not survive a fork"""
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="groq-call"
+                )
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def route(self, simple: bool) -> Tuple[str, Optional[str]]:
+        """(model to call first, alternate model for hedging)"""
+        if simple and self.fast_model:
+            return self.fast_model, self.primary_model
+        return self.primary_model, self.fast_model
+
+    def hedge_delay(self, model: str) -> float:
+        stats = self._stats[model]
+        with self._lock:
+            if len(stats.latencies) < self.min_samples:
+                return self.default_hedge_delay_s
+            delay = stats.percentile(self.hedge_percentile)
+        return min(self.hedge_max_s, max(self.hedge_min_s, delay))
+
+    def _submit(self, model: str, call: Callable[[str], List[Dict]]) -> Future:
+        # Each call runs in its own copy of the caller's context so profiling spans follow it
+        future = self._get_executor().submit(contextvars.copy_context().run, self._timed_call, model, call)
+        with self._lock:
+            self._inflight += 1
+        future.add_done_callback(self._call_done)
+        return future
+
+    def _call_done(self, _: Future) -> None:
+        with self._lock:
+            self._inflight -= 1
+
+    def _take_hedge(self) -> bool:
+        """Whether a hedge may be sent now: pool not backlogged and hedge budget left"""
+        with self._lock:
+            if self._inflight >= self.busy_threshold or self._hedge_credit < 1:
+                return False
+            self._hedge_credit -= 1
+            return True
+
+    def _timed_call(self, model: str, call: Callable[[str], List[Dict]]) -> List[Dict]:
+        started = time.monotonic()
+        try:
+            # Runs on a pool thread: cprofile mode must follow the request here
+            with profiler.thread():
+                result = call(model)
+        except DeadlineExceededError:
+            # Not enough budget to even start the call - nothing to record
+            raise
+        except RecommendationError:
+            self._record(model, time.monotonic() - started, "invalid")
+            raise
+        except Exception:
+            self._record(model, time.monotonic() - started, "error")
+            raise
+        self._record(model, time.monotonic() - started, "ok", len(result))
+        return result
+
+    def _record(self, model: str, latency_s: float, outcome: str, items: int = 0) -> None:
+        with self._lock:
+            self._stats[model].record(latency_s, outcome, items)
+
+    def _result(self, future: Future, model: str, deadline: Deadline) -> List[Dict]:
+        """Result of one in-flight call, abandoning it when the deadline runs out"""
+        try:
+            return future.result(timeout=deadline.remaining())
+        # Not the builtin TimeoutError before Python 3.11
+        except FutureTimeoutError:
+            with self._lock:
+                self._stats[model].abandoned += 1
+            raise DeadlineExceededError(message=f"'{model}' did not answer in time", model=model)
+
+    def execute(
+        self,
+        model: str,
+        alternate: Optional[str],
+        call: Callable[[str], List[Dict]],
+        deadline: Deadline
+    ) -> List[Dict]:
+        """
+        Run `call(model)`, hedging to `alternate` if it is slow.
+        Raises the primary's exception if every launched call fails, and
+        DeadlineExceededError if nothing answers before `deadline`.
+        """
+        primary = self._submit(model, call)
+        if not self.hedge_enabled or alternate is None:
+            # Always waited on here: the HTTP timeout bounds each socket read,
+            # not the whole call, so a trickling response could outlive the deadline
+            return self._result(primary, model, deadline)
+
+        with self._lock:
+            self._hedge_credit = min(self.HEDGE_BURST, self._hedge_credit + self.max_hedge_rate)
+        delay = self.hedge_delay(model)
+        done, _ = wait([primary], timeout=deadline.clamp(delay))
+        if done or deadline.remaining() <= delay or not self._take_hedge():
+            # Answered (or failed) in time, no time left for a second call,
+            # or a second call would add load the pool can't take right now
+            return self._result(primary, model, deadline)
+
+        logger.info(f"Hedging '{model}' after {delay:.2f}s with '{alternate}'")
+        with self._lock:
+            self._stats[alternate].hedges_launched += 1
+        hedge = self._submit(alternate, call)
+        owners = {primary: model, hedge: alternate}
+        pending = {primary, hedge}
+        first_error: Optional[BaseException] = None
+
+        while pending:
+            done, pending = wait(pending, timeout=deadline.remaining(), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                error = future.exception()
+                if error is None:
+                    winner = owners[future]
+                    with self._lock:
+                        if future is hedge:
+                            self._stats[winner].hedge_wins += 1
+                        for loser in pending:
+                            loser.cancel()
+                            self._stats[owners[loser]].abandoned += 1
+                    return future.result()
+                if first_error is None or future is primary:
+                    first_error = error
+
+        with self._lock:
+            for future in pending:
+                self._stats[owners[future]].abandoned += 1
+        if first_error is not None:
+            raise first_error
+        # Deadline ran out with both calls still in flight
+        raise DeadlineExceededError(
+            message=f"No model answered within the deadline ({model}, {alternate})",
+            model=model
+        )
+
+    def stats(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {model: stats.snapshot() for model, stats in self._stats.items()}
@@ -1,20 +1,80 @@
 import os
-import json
 import requests
 import time
 import random
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 from dotenv import load_dotenv
-from utils.custom_exception import RecommendationError
+from utils.custom_exception import (
+    RecommendationError, DeadlineExceededError, CircuitOpenError, InvalidResponseError
+)
+from utils.resilience import Deadline, CircuitBreaker
+from utils.profiling import profiler
+from src.model_router import ModelRouter
+from src.json_salvage import loads, salvage_recommendations
+from src.token_budget import (
+    TokenLedger, estimate_message_tokens, max_items_for, max_tokens_for, trim_to_budget
+)
+from src.prompt_template import get_followup_questions_prompt
 from utils.logger import logger
 
 load_dotenv()
 
 class AnimeRecommender:
+    ANIME_TERMS = {
+        'action', 'comedy', 'romance', 'horror', 'sci-fi', 'fantasy',
+        'drama', 'mecha', 'shounen', 'shoujo', 'seinen', 'josei',
+        'slice of life', 'isekai', 'psychological', 'thriller', 'anime'
+    }
+
+    SYSTEM_PROMPTS = {
+        "full": """You are an expert anime recommendation system.
+                    For non-anime queries:
+                    - Return anime with conceptual connections
+                    - Score 60-80 with clear explanations
+                    - Example: "apple" → "Fruit-themed anime"
+
+                    For anime queries:
+                    - Return direct matches
+                    - Score 85-100
+                    - Follow exact JSON format:
+                    {
+                        "recommendations": [
+                            {
+                                "title": "string",
+                                "description": "string",
+                                "score": int,
+                                "genres": ["string"],
+                                "year": int,
+                                "why": "string"
+                            }
+                        ]
+                    }""",
+        # Same instructions without the indentation and prose: ~1/3 of the tokens
+        "compact": (
+            "You recommend anime. Reply with JSON only: "
+            '{"recommendations":[{"title":str,"description":str,"score":int,'
+            '"genres":[str],"year":int,"why":str}]}. '
+            "Anime queries: direct matches, score 85-100. "
+            "Non-anime queries: conceptual connections, score 60-80, explain in why. "
+            "description: max 2 sentences. why: 1 sentence."
+        ),
+        # Title + why only; description and genres are filled from the catalog
+        "lean": (
+            "You recommend anime. Reply with JSON only: "
+            '{"recommendations":[{"title":str,"score":int,"why":str}]}. '
+            "Use the official title. Anime queries: direct matches, score 85-100. "
+            "Non-anime queries: conceptual connections, score 60-80. why: 1 sentence."
+        )
+    }
+    # Output tokens per item for each prompt variant's schema
+    TOKENS_PER_ITEM = {"full": 150, "compact": 150, "lean": 50}
+
     def __init__(self):
         self.api_key = os.getenv("GROQ_API_KEY")
         self.model = os.getenv("GROQ_MODEL", "llama3-70b-8192")
-        self.base_url = "https://api.groq.com/openai/v1/chat/completions"
+        self.router = ModelRouter.from_env(self.model)
+        # Overridable so load tests can point at a local stub (benchmarks/groq_stub.py)
+        self.base_url = os.getenv("GROQ_BASE_URL", "https://api.groq.com/openai/v1/chat/completions")
         self.headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
@@ -23,138 +83,340 @@ class AnimeRecommender:
         self.base_delay = 1.5
         self.request_interval = 1.2
         self.timeout = 20
+        # Don't start an attempt with less time than this left on the deadline
+        self.min_attempt_s = float(os.getenv("LLM_MIN_ATTEMPT_S", 1.0))
+        self.prompt_variant = os.getenv("PROMPT_VARIANT", "compact")
+        if self.prompt_variant not in self.SYSTEM_PROMPTS:
+            raise ValueError(f"Unknown PROMPT_VARIANT '{self.prompt_variant}'")
+        self.context_token_budget = int(os.getenv("CONTEXT_TOKEN_BUDGET", 600))
+        # Output ceiling per completion; the item count is capped to what fits so answers aren't cut off
+        self.max_output_tokens = int(os.getenv("LLM_MAX_OUTPUT_TOKENS", 2048))
+        self.max_items = max_items_for(self.max_output_tokens, self.TOKENS_PER_ITEM[self.prompt_variant])
+        self.tokens = TokenLedger()
+        self.breaker = CircuitBreaker(
+            name="groq",
+            failure_threshold=int(os.getenv("BREAKER_FAILURE_THRESHOLD", 3)),
+            slow_threshold=int(os.getenv("BREAKER_SLOW_THRESHOLD", 3)),
+            latency_slo_s=float(os.getenv("LLM_LATENCY_SLO_S", 8)),
+            cooldown_s=float(os.getenv("BREAKER_COOLDOWN_S", 30))
+        )
 
     def _validate_query(self, query: str) -> str:
         """Enhance queries lacking anime context"""
         query = query.strip().lower()
-        anime_terms = {
-            'action', 'comedy', 'romance', 'horror', 'sci-fi', 'fantasy',
-            'drama', 'mecha', 'shounen', 'shoujo', 'seinen', 'josei',
-            'slice of life', 'isekai', 'psychological', 'thriller', 'anime'
-        }
 
-        if not any(term in query for term in anime_terms):
+        if not any(term in query for term in self.ANIME_TERMS):
             if len(query.split()) == 1:
                 return f"anime about {query}"
             return f"anime that relates to {query}"
         return query
 
-    def _build_payload(self, query: str) -> Dict:
+    def _is_simple_query(self, query: str) -> bool:
+        """A bare genre such as 'romance' or 'slice of life anime'"""
+        core = query.replace('anime', '').strip()
+        return core in self.ANIME_TERMS
+
+    def _build_payload(
+        self,
+        query: str,
+        model: Optional[str] = None,
+        n_items: int = 5,
+        context: Optional[List[str]] = None,
+        exclude: Optional[List[str]] = None
+    ) -> Dict:
         """Create optimized payload with relevance handling"""
+        system_prompt = self.SYSTEM_PROMPTS[self.prompt_variant]
+        user_prompt = f"Recommend {n_items} anime for: '{query}'"
+        if context:
+            snippets = trim_to_budget(context, self.context_token_budget)
+            user_prompt += "\nCandidates from our catalog (prefer these when relevant):\n" + "\n".join(
+                f"- {snippet}" for snippet in snippets
+            )
+
+        if exclude:
+            user_prompt += f"\nDo not include: {'; '.join(exclude)}"
+
         return {
-            "model": self.model,
+            "model": model or self.model,
             "messages": [
                 {
                     "role": "system",
-                    "content": """You are an expert anime recommendation system.
-                    For non-anime queries:
-                    - Return anime with conceptual connections
-                    - Score 60-80 with clear explanations
-                    - Example: "apple" → "Fruit-themed anime"
-
-                    For anime queries:
-                    - Return direct matches
-                    - Score 85-100
-                    - Follow exact JSON format:
-                    {
-                        "recommendations": [
-                            {
-                                "title": "string",
-                                "description": "string",
-                                "score": int,
-                                "genres": ["string"],
-                                "year": int,
-                                "why": "string"
-                            }
-                        ]
-                    }"""
+                    "content": system_prompt
                 },
                 {
                     "role": "user",
-                    "content": f"Recommend 5 anime for: '{query}'"
+                    "content": user_prompt
                 }
             ],
             "response_format": {"type": "json_object"},
             "temperature": 0.7,
-            "max_tokens": 1200,
+            "max_tokens": max_tokens_for(
+                n_items, self.TOKENS_PER_ITEM[self.prompt_variant], cap=self.max_output_tokens
+            ),
             "top_p": 0.9
         }
 
-    def get_recommendations(self, query: str) -> List[Dict]:
-        """Main recommendation method with enhanced query handling"""
-        query = self._validate_query(query)
-        payload = self._build_payload(query)
-        last_request = 0
+    def _check_circuit(self, query: str) -> None:
+        if not self.breaker.allow_request():
+            raise CircuitOpenError(
+                message="LLM circuit open",
+                query=query,
+                model=self.model
+            )
 
-        for attempt in range(1, self.max_retries + 1):
-            try:
-                # Rate limiting
-                elapsed = time.time() - last_request
-                if elapsed < self.request_interval:
-                    time.sleep(self.request_interval - elapsed)
-                last_request = time.time()
+    def _attempt_timeout(self, query: str, model: str, deadline: Deadline) -> float:
+        """Per-call timeout, or raise if the deadline leaves no room for a call"""
+        timeout = deadline.clamp(self.timeout)
+        if timeout < self.min_attempt_s:
+            raise DeadlineExceededError(
+                message=f"Only {timeout:.2f}s left before deadline",
+                query=query,
+                model=model
+            )
+        return timeout
 
+    def _post(self, payload: Dict, timeout: float) -> Dict:
+        """POST one chat completion and decode the envelope"""
+        try:
+            with profiler.span("http"):
                 response = requests.post(
                     self.base_url,
                     headers=self.headers,
                     json=payload,
-                    timeout=self.timeout
+                    timeout=timeout
                 )
 
-                if response.status_code >= 500:
-                    raise requests.HTTPError(f"Server error {response.status_code}")
+            if response.status_code >= 500:
+                raise requests.HTTPError(f"Server error {response.status_code}")
 
-                response.raise_for_status()
+            response.raise_for_status()
+        except requests.RequestException:
+            self.breaker.record_failure()
+            raise
 
-                # Process response
-                content = response.json()
-                result = content['choices'][0]['message']['content']
+        with profiler.span("json_parse"):
+            content = loads(response.content)
+        self.tokens.record(
+            payload['model'],
+            estimated_prompt=estimate_message_tokens(payload['messages']),
+            max_tokens=payload['max_tokens'],
+            usage=content.get('usage') if isinstance(content, dict) else None
+        )
+        return content
 
+    @staticmethod
+    def _text(value) -> str:
+        return value if isinstance(value, str) else ''
+
+    def _parse_items(self, content: Dict) -> Tuple[List[Dict], bool]:
+        """
+        Validate recommendations from a completion, salvaging what it can.
+        Returns (valid items, complete) - complete is False if the output was
+        truncated or repaired.
+        """
+        choice = content['choices'][0]
+        with profiler.span("salvage"):
+            items, complete = salvage_recommendations(choice['message']['content'])
+        complete = complete and choice.get('finish_reason') != 'length'
+
+        # Validate recommendations
+        required = ['title', 'score'] if self.prompt_variant == "lean" else ['title', 'description', 'score']
+        valid_recs = []
+        with profiler.span("validation"):
+            for rec in items:
+                if not isinstance(rec, dict) or not all(k in rec for k in required):
+                    continue
                 try:
-                    data = json.loads(result)
-                    if 'recommendations' not in data:
-                        raise ValueError("Missing recommendations key")
-
-                    # Validate recommendations
-                    valid_recs = []
-                    for rec in data['recommendations']:
-                        if not all(k in rec for k in ['title', 'description', 'score']):
-                            continue
-
-                        valid_recs.append({
-                            'anime': rec['title'],
-                            'description': rec['description'],
-                            'match_score': min(100, max(1, int(rec['score']))),
-                            'genres': rec.get('genres', []),
-                            'year': rec.get('year', ''),
-                            'why': rec.get('why', '')
-                        })
-
-                    if not valid_recs:
-                        raise ValueError("No valid recommendations")
-
-                    logger.info(f"Processed {len(valid_recs)} recs for: '{query}'")
-                    return valid_recs[:5]
-
-                except (json.JSONDecodeError, ValueError) as e:
-                    logger.error(f"Response validation failed: {str(e)}")
+                    match_score = min(100, max(1, int(rec['score'])))
+                except (TypeError, ValueError):
+                    continue
+
+                if not isinstance(rec['title'], str) or not rec['title'].strip():
+                    continue
+
+                # The model sometimes sends null or a bare string where the schema says list/str
+                genres = rec.get('genres')
+                if isinstance(genres, str):
+                    genres = genres.split(',')
+                if not isinstance(genres, list):
+                    genres = []
+                valid_recs.append({
+                    'anime': rec['title'].strip(),
+                    'description': self._text(rec.get('description')),
+                    'match_score': match_score,
+                    'genres': [genre.strip() for genre in genres if isinstance(genre, str) and genre.strip()],
+                    'year': rec.get('year') or '',
+                    'why': self._text(rec.get('why'))
+                })
+        return valid_recs, complete
+
+    def _reask_missing(
+        self,
+        model: str,
+        query: str,
+        deadline: Deadline,
+        missing: int,
+        context: Optional[List[str]],
+        exclude: List[str]
+    ) -> List[Dict]:
+        """One small follow-up request for just the items a truncated answer lost"""
+        try:
+            timeout = self._attempt_timeout(query, model, deadline)
+            payload = self._build_payload(query, model, missing, context, exclude)
+            items, _ = self._parse_items(self._post(payload, timeout))
+            logger.info(f"Re-ask recovered {len(items)}/{missing} missing recs from '{model}'")
+            return items[:missing]
+        except (
+            requests.RequestException, RecommendationError, ValueError, KeyError, IndexError, TypeError, AttributeError
+        ) as e:
+            logger.warning(f"Re-ask for {missing} missing recs failed: {str(e)}")
+            return []
+
+    def _call_model(
+        self,
+        model: str,
+        query: str,
+        deadline: Deadline,
+        n_items: int = 5,
+        context: Optional[List[str]] = None,
+        exclude: Optional[List[str]] = None
+    ) -> List[Dict]:
+        """One request to one model; raises RequestException or RecommendationError"""
+        try:
+            timeout = self._attempt_timeout(query, model, deadline)
+            with profiler.span("payload_build"):
+                payload = self._build_payload(query, model, n_items, context, exclude)
+            started = time.monotonic()
+
+            try:
+                valid_recs, complete = self._parse_items(self._post(payload, timeout))
+                if not valid_recs:
+                    raise ValueError("No valid recommendations")
+            except (ValueError, KeyError, IndexError, TypeError, AttributeError) as e:
+                self.breaker.record_failure()
+                logger.error(f"Response validation failed: {str(e)}")
+                raise InvalidResponseError(
+                    message="Invalid response format",
+                    query=query,
+                    model=model,
+                    error_detail=e
+                )
+
+            self.breaker.record_success(time.monotonic() - started)
+        finally:
+            # No-op once an outcome is recorded; otherwise (deadline spent before the
+            # POST, an unexpected error) a half-open probe must not stay taken
+            self.breaker.release_probe()
+        if not complete:
+            logger.warning(f"Salvaged {len(valid_recs)} recs from a truncated/invalid response")
+
+        missing = n_items - len(valid_recs)
+        if missing > 0:
+            valid_recs += self._reask_missing(
+                model, query, deadline, missing, context,
+                exclude=(exclude or []) + [rec['anime'] for rec in valid_recs]
+            )
+
+        logger.info(f"Processed {len(valid_recs)} recs from '{model}' for: '{query}'")
+        return valid_recs[:n_items]
+
+    def get_recommendations(
+        self,
+        query: str,
+        deadline: Optional[Deadline] = None,
+        n_items: int = 5,
+        context: Optional[List[str]] = None,
+        exclude: Optional[List[str]] = None
+    ) -> List[Dict]:
+        """Main recommendation method with enhanced query handling"""
+        with profiler.span("query_normalization"):
+            query = self._validate_query(query)
+            model, alternate = self.router.route(simple=self._is_simple_query(query))
+        deadline = deadline or Deadline(self.max_retries * (self.timeout + 10))
+        if n_items > self.max_items:
+            logger.warning(f"{n_items} recs exceed the {self.max_output_tokens}-token output cap, asking for {self.max_items}")
+            n_items = self.max_items
+        last_request = 0
+
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                # Rate limiting
+                elapsed = time.time() - last_request
+                if elapsed < self.request_interval:
+                    time.sleep(deadline.clamp(self.request_interval - elapsed))
+                last_request = time.time()
+
+                # Before taking a (half-open) breaker slot, so a spent deadline can't hold it
+                self._attempt_timeout(query, model, deadline)
+                self._check_circuit(query)
+                return self.router.execute(
+                    model,
+                    alternate,
+                    lambda chosen: self._call_model(chosen, query, deadline, n_items, context, exclude),
+                    deadline
+                )
+
+            except (requests.RequestException, InvalidResponseError) as e:
+                if attempt == self.max_retries:
                     raise RecommendationError(
-                        message="Invalid response format",
+                        message="Service unavailable after retries",
                         query=query,
-                        model=self.model,
+                        model=model,
                         error_detail=e
                     )
-
-            except requests.RequestException as e:
                 delay = min(self.base_delay * (2 ** (attempt - 1)), 10) + random.random()
-                logger.warning(f"Attempt {attempt} failed, retrying in {delay:.1f}s")
-                time.sleep(delay)
-                if attempt == self.max_retries:
-                    raise RecommendationError(
-                        message="Service unavailable after retries",
+                if delay + self.min_attempt_s > deadline.remaining():
+                    raise DeadlineExceededError(
+                        message="No time left to retry",
                         query=query,
-                        model=self.model,
+                        model=model,
                         error_detail=e
                     )
+                logger.warning(f"Attempt {attempt} failed, retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+        return []
+
+    def followup_questions(self, recommendations: List[Dict], deadline: Optional[Deadline] = None) -> List[str]:
+        """2-3 questions that help the user refine, from the follow-up prompt template"""
+        model, _ = self.router.route(simple=True)
+        deadline = deadline or Deadline(self.timeout)
+        prompt = get_followup_questions_prompt().format(
+            recommendations="\n".join(f"- {rec['anime']}: {rec.get('why', '')}" for rec in recommendations)
+        )
+        payload = {
+            "model": model,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": 0.7,
+            "max_tokens": 120
+        }
+        timeout = self._attempt_timeout("follow-up questions", model, deadline)
+
+        # Counts toward the breaker like any call, so a half-open probe always gets an outcome
+        self._check_circuit("follow-up questions")
+        started = time.monotonic()
+        try:
+            content = self._post(payload, timeout)
+            text = content['choices'][0]['message']['content']
+            self.breaker.record_success(time.monotonic() - started)
+        except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+            self.breaker.record_failure()
+            raise
+        finally:
+            # No-op once an outcome is recorded
+            self.breaker.release_probe()
+
+        questions = []
+        for line in text.splitlines():
+            line = line.strip().lstrip("-*•0123456789.) ").strip()
+            if line.endswith("?"):
+                questions.append(line)
+        return questions[:3]
+
+    def model_stats(self) -> Dict[str, Dict]:
+        """Per-model latency/quality stats for tuning routing and hedging"""
+        return self.router.stats()
 
-        return []
\ No newline at end of file
+    def token_stats(self) -> Dict[str, Dict]:
+        """Per-model token usage, estimated and reported"""
+        return self.tokens.snapshot()
@@ -0,0 +1,447 @@
+import re
+import numpy as np
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+from src.catalog import AnimeCatalog
+from src.fallback import CatalogFallback
+from src.title_embeddings import TitleEmbeddings
+from src.title_index import normalize_title
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Words people refine with that are not genre names in the catalog
+GENRE_SYNONYMS = {
+    "violent": ["Action", "Military", "Martial Arts", "Horror"],
+    "violence": ["Action", "Military", "Martial Arts", "Horror"],
+    "gore": ["Horror"],
+    "gory": ["Horror"],
+    "scary": ["Horror"],
+    "creepy": ["Horror", "Psychological"],
+    "dark": ["Psychological", "Horror", "Dementia"],
+    "funny": ["Comedy", "Parody"],
+    "comedic": ["Comedy"],
+    "romantic": ["Romance"],
+    "love": ["Romance"],
+    "sad": ["Drama"],
+    "serious": ["Drama", "Psychological"],
+    "robot": ["Mecha"],
+    "robots": ["Mecha"],
+    "magical": ["Magic"],
+    "fighting": ["Martial Arts", "Action"],
+    "fanservice": ["Ecchi", "Harem"],
+    "war": ["Military"],
+    "scifi": ["Sci-Fi"],
+}
+
+# Refinements the catalog has no data for (no episode counts or air dates)
+UNSUPPORTED = {
+    "shorter": "Episode counts aren't in our catalog, so 'shorter' can't be applied",
+    "longer": "Episode counts aren't in our catalog, so 'longer' can't be applied",
+    "newer": "Air dates aren't in our catalog, so 'newer' can't be applied",
+    "older": "Air dates aren't in our catalog, so 'older' can't be applied",
+}
+
+_CLAUSE_SPLIT = re.compile(r"\s*(?:,|;|\band\b|\bbut\b)\s*")
+_WORD = re.compile(r"[a-z0-9][a-z0-9\-]+")
+# Filler around a refinement's subject: 'not so MUCH romance', 'no horror AT ALL'
+_STOPWORDS = CatalogFallback.STOPWORDS | {
+    "more", "less", "please", "stuff", "things", "one", "ones", "much", "too", "any", "anything",
+    "really", "very", "all", "lot", "lots", "kind", "bit", "dont", "nothing", "avoid", "just"
+}
+# Longest phrase first so 'not so much' wins over 'not' and 'no more' over 'no'
+_DIRECTIVE = re.compile(
+    r"(?:i\s+)?(no more|none of|nothing|no|without|not so much|not too much|not as much|not much|not|"
+    r"avoid|skip|exclude|(?:do not|dont) want|dont|only|less of|less|fewer|more of|more)\s+(.+)"
+)
+_EXCLUDE = {"no more", "none of", "nothing", "no", "without", "not", "avoid", "skip", "exclude",
+            "do not want", "dont want", "dont"}
+_DEMOTE = {"not so much", "not too much", "not as much", "not much", "less of", "less", "fewer"}
+
+class Refinement:
+    """Constraints parsed from one refinement such as 'less violent, no mecha'"""
+
+    def __init__(self):
+        self.include: Set[str] = set()
+        self.exclude: Set[str] = set()
+        self.genre_weights: Dict[str, float] = {}
+        self.term_weights: Dict[str, float] = {}
+        self.anchors: List[int] = []
+        self.raise_min_score = False
+        self.notes: List[str] = []
+
+def _genres_for(phrase: str, genres_lc: Dict[str, str]) -> List[str]:
+    """Catalog genres a phrase names: exactly, as a plural, or via a synonym"""
+    phrase = phrase.strip().lower()
+    for candidate in (phrase, phrase[:-1] if phrase.endswith("s") else phrase):
+        if candidate in genres_lc:
+            return [genres_lc[candidate]]
+    return GENRE_SYNONYMS.get(phrase, [])
+
+def _split_target(target: str, genres_lc: Dict[str, str]) -> Tuple[List[str], List[str]]:
+    """(genres, keywords) in a phrase such as 'space pirates' -> (['Space'], ['pirates'])"""
+    genres = _genres_for(target, genres_lc)
+    if genres:
+        return genres, []
+    genres, terms = [], []
+    for word in _WORD.findall(target):
+        matched = _genres_for(word, genres_lc)
+        if matched:
+            genres += [genre for genre in matched if genre not in genres]
+        elif len(word) > 2 and word not in _STOPWORDS:
+            terms.append(word)
+    return genres, terms
+
+def parse_refinement(
+    text: str,
+    genres: Iterable[str],
+    lookup: Optional[Callable[[str], Optional[Dict]]] = None
+) -> Refinement:
+    """
+    Parse free-text refinements clause by clause:
+      'no X' / 'without X'   - drop titles with genre X (also 'nothing X',
+                               'avoid X', "don't want X")
+      'only X'               - keep only titles with genre X
+      'more X' / 'less X'    - boost or demote genre X (or keyword X);
+                               'not so much X' / 'less of X' demote too
+      'like <title>'         - favour titles close to <title>
+      'higher rated'         - raise the minimum MAL score
+    Anything else boosts matching keywords in titles and synopses.
+    """
+    refinement = Refinement()
+    genres_lc = {genre.lower(): genre for genre in genres}
+
+    text = text.strip().lower().replace("'", "").replace("\u2019", "")
+    for clause in _CLAUSE_SPLIT.split(text):
+        clause = " ".join(clause.strip(" .!?").split())
+        if not clause:
+            continue
+
+        word = clause.split()[0]
+        if clause in UNSUPPORTED or word in UNSUPPORTED:
+            refinement.notes.append(UNSUPPORTED.get(clause, UNSUPPORTED.get(word)))
+            continue
+        if re.fullmatch(r"(?:higher|better|top|highly)(?:[\s-]rated)?|best", clause):
+            refinement.raise_min_score = True
+            continue
+
+        like = re.fullmatch(r"(?:more |something )?(?:like|similar to)\s+(.+)", clause)
+        if like:
+            record = lookup(like.group(1)) if lookup else None
+            if record is None:
+                refinement.notes.append(f"Couldn't find '{like.group(1)}' in our catalog")
+            else:
+                refinement.anchors.append(record["mal_id"])
+            continue
+
+        directive = _DIRECTIVE.fullmatch(clause)
+        action, target = directive.groups() if directive else ("more", clause)
+        genres, terms = _split_target(target, genres_lc)
+        if action in _EXCLUDE:
+            refinement.exclude.update(genres)
+            weight = -2.0
+        elif action == "only":
+            refinement.include.update(genres)
+            weight = 1.0
+        else:
+            weight = -1.0 if action in _DEMOTE else 1.0
+            for genre in genres:
+                refinement.genre_weights[genre] = refinement.genre_weights.get(genre, 0.0) + weight
+        for term in terms:
+            refinement.term_weights[term] = refinement.term_weights.get(term, 0.0) + weight
+    return refinement
+
+class ResultSession:
+    """
+    One search's over-fetched candidate pool, refined and paged locally.
+
+    Candidates keep the LLM/catalog match score as base relevance.
+    Refinements adjust it with genre, keyword and "like <title>" terms, filters
+    drop candidates, and the page order comes from MMR over the pool's
+    pairwise similarity (title embeddings, genre overlap where a title has
+    none). Everything is numpy over at most a few hundred rows, so a
+    refinement costs a few milliseconds and no LLM call until the pool runs
+    out. The state round-trips through `to_dict` so stateless API
+    workers can serve follow-up requests.
+    """
+
+    GENRE_WEIGHT = 0.25
+    TERM_WEIGHT = 0.15
+    ANCHOR_WEIGHT = 0.5
+    SCORE_WEIGHT = 0.05
+    MIN_SCORE_STEP = 0.5
+    DEFAULT_MIN_SCORE = 7.5
+    # MMR is quadratic in the pool; state sent back by clients is capped
+    MAX_CANDIDATES = 300
+    # Client-held text ends up in LLM prompts, so it gets the same limit as a query
+    MAX_TEXT_LEN = 200
+    MAX_REFINEMENTS = 20
+    # The API's MAX_RESULTS: a page is asked of the LLM in one call when the pool runs dry
+    MAX_PAGE_SIZE = 10
+
+    def __init__(
+        self,
+        query: str,
+        catalog: AnimeCatalog,
+        embeddings: Optional[TitleEmbeddings] = None,
+        page_size: int = 5,
+        diversity: float = 0.3
+    ):
+        self.query = query
+        self.catalog = catalog
+        self.embeddings = embeddings
+        self.page_size = page_size
+        self.diversity = diversity
+        self.candidates: List[Dict] = []
+        self.refinements: List[str] = []
+        self.include: Set[str] = set()
+        self.exclude: Set[str] = set()
+        self.genre_weights: Dict[str, float] = {}
+        self.term_weights: Dict[str, float] = {}
+        self.anchors: List[int] = []
+        self.min_score: Optional[float] = None
+        self._keys: Dict[str, int] = {}
+        self._ranking: Optional[np.ndarray] = None
+
+    @staticmethod
+    def _key(candidate: Dict) -> str:
+        mal_id = candidate.get("mal_id")
+        return f"id:{mal_id}" if mal_id is not None else f"title:{normalize_title(candidate.get('anime', ''))}"
+
+    @classmethod
+    def _clean(cls, candidate: Dict) -> Optional[Dict]:
+        """
+        Copy of a candidate with the fields reranking reads coerced to their
+        types, or None without a usable title. Candidates come from the LLM and
+        from client-held session state, so nulls and wrong types do occur.
+        """
+        if not isinstance(candidate, dict) or not isinstance(candidate.get("anime"), str):
+            return None
+        candidate = dict(candidate, anime=candidate["anime"].strip())
+        if not candidate["anime"] or len(candidate["anime"]) > cls.MAX_TEXT_LEN:
+            return None
+
+        genres = candidate.get("genres")
+        if isinstance(genres, str):
+            genres = genres.split(",")
+        if not isinstance(genres, list):
+            genres = []
+        candidate["genres"] = [genre.strip() for genre in genres if isinstance(genre, str) and genre.strip()]
+        if not isinstance(candidate.get("description"), str):
+            candidate["description"] = ""
+        if not isinstance(candidate.get("match_score"), (int, float)):
+            try:
+                candidate["match_score"] = float(candidate["match_score"])
+            except (KeyError, TypeError, ValueError):
+                candidate["match_score"] = 50
+        if candidate.get("mal_id") is not None:
+            try:
+                candidate["mal_id"] = int(candidate["mal_id"])
+            except (TypeError, ValueError):
+                del candidate["mal_id"]
+        return candidate
+
+    def add(self, candidates: List[Dict]) -> int:
+        """Merge candidates into the pool (duplicates keep the higher score); returns how many were new"""
+        added = 0
+        for candidate in map(self._clean, candidates):
+            if candidate is None:
+                continue
+            key = self._key(candidate)
+            existing = self._keys.get(key)
+            if existing is None:
+                self._keys[key] = len(self.candidates)
+                self.candidates.append(candidate)
+                added += 1
+            elif candidate.get("match_score", 0) > self.candidates[existing].get("match_score", 0):
+                self.candidates[existing] = candidate
+        if candidates:
+            self._index()
+        return added
+
+    def _index(self) -> None:
+        """Per-candidate arrays used by every rerank, rebuilt when the pool changes"""
+        records = [
+            self.catalog.get_by_mal_id(candidate["mal_id"]) if candidate.get("mal_id") is not None else None
+            for candidate in self.candidates
+        ]
+        genres = [record["genres"] if record else candidate.get("genres", []) for record, candidate in zip(records, self.candidates)]
+        self._genres = sorted({genre for item in genres for genre in item})
+        column = {genre: i for i, genre in enumerate(self._genres)}
+        n = len(self.candidates)
+
+        self._genre_matrix = np.zeros((n, len(self._genres)), dtype=np.float32)
+        for row, item in enumerate(genres):
+            self._genre_matrix[row, [column[genre] for genre in item]] = 1.0
+        self._base = np.array([c.get("match_score", 50) for c in self.candidates], dtype=np.float32) / 100
+        self._scores = np.array([record["score"] if record else 0.0 for record in records], dtype=np.float32)
+        self._mal_ids = np.array([c.get("mal_id", -1) if c.get("mal_id") is not None else -1 for c in self.candidates])
+        self._texts = np.array([
+            " ".join([c["anime"], c.get("description", ""), record["synopsis"] if record else ""]).lower()
+            for c, record in zip(self.candidates, records)
+        ])
+
+        # Pairwise similarity: cosine where both titles have embeddings, genre Jaccard otherwise
+        inter = self._genre_matrix @ self._genre_matrix.T
+        sizes = self._genre_matrix.sum(axis=1)
+        self._sims = inter / np.maximum(sizes[:, None] + sizes[None, :] - inter, 1.0)
+        self._vectors, self._has_vector = None, np.zeros(n, dtype=bool)
+        if self.embeddings is not None:
+            self._vectors, self._has_vector = self.embeddings.matrix(
+                [c.get("mal_id") for c in self.candidates]
+            )
+            both = self._has_vector[:, None] & self._has_vector[None, :]
+            self._sims = np.where(both, self._vectors @ self._vectors.T, self._sims)
+        self._ranking = None
+
+    def apply(self, text: str, lookup: Optional[Callable[[str], Optional[Dict]]] = None) -> List[str]:
+        """Parse and apply a free-text refinement; returns notes for what couldn't be applied"""
+        refinement = parse_refinement(text, self.catalog_genres(), lookup)
+        # Older refinements live on in the weights; only the recent ones go back to the LLM
+        self.refinements = (self.refinements + [text.strip()[:self.MAX_TEXT_LEN]])[-self.MAX_REFINEMENTS:]
+        self.include |= refinement.include
+        self.exclude |= refinement.exclude
+        self.include -= self.exclude
+        for genre, weight in refinement.genre_weights.items():
+            self.genre_weights[genre] = self.genre_weights.get(genre, 0.0) + weight
+        for term, weight in refinement.term_weights.items():
+            self.term_weights[term] = self.term_weights.get(term, 0.0) + weight
+        self.anchors += [mal_id for mal_id in refinement.anchors if mal_id not in self.anchors]
+        if refinement.raise_min_score:
+            self.min_score = self.DEFAULT_MIN_SCORE if self.min_score is None else self.min_score + self.MIN_SCORE_STEP
+        self._ranking = None
+        logger.info(f"Refinement '{text}' applied to a pool of {len(self.candidates)}")
+        return refinement.notes
+
+    def set_filters(
+        self,
+        include: Optional[Iterable[str]] = None,
+        exclude: Optional[Iterable[str]] = None,
+        min_score: Optional[float] = None
+    ) -> None:
+        """Replace the hard filters (e.g. from UI widgets); None leaves one unchanged"""
+        if include is not None:
+            self.include = set(include)
+        if exclude is not None:
+            self.exclude = set(exclude)
+        if min_score is not None:
+            self.min_score = min_score or None
+        self._ranking = None
+
+    def catalog_genres(self) -> List[str]:
+        return sorted({genre for record in self.catalog.records for genre in record["genres"]})
+
+    def _relevance(self) -> np.ndarray:
+        relevance = self._base + self.SCORE_WEIGHT * self._scores / 10
+        if self.genre_weights and len(self._genres):
+            weights = np.array([self.genre_weights.get(genre, 0.0) for genre in self._genres], dtype=np.float32)
+            relevance += self.GENRE_WEIGHT * (self._genre_matrix @ weights)
+        for term, weight in self.term_weights.items():
+            relevance += self.TERM_WEIGHT * weight * (np.char.find(self._texts, term) >= 0)
+        if self.anchors and self._vectors is not None:
+            anchors, found = self.embeddings.matrix(self.anchors)
+            if found.any():
+                closeness = (self._vectors @ anchors[found].T).max(axis=1)
+                relevance += self.ANCHOR_WEIGHT * np.where(self._has_vector, closeness, 0.0)
+        return relevance
+
+    def _eligible(self) -> np.ndarray:
+        eligible = np.ones(len(self.candidates), dtype=bool)
+        column = {genre: i for i, genre in enumerate(self._genres)}
+        excluded = [column[genre] for genre in self.exclude if genre in column]
+        if excluded:
+            eligible &= self._genre_matrix[:, excluded].sum(axis=1) == 0
+        if self.include:
+            included = [column[genre] for genre in self.include if genre in column]
+            eligible &= self._genre_matrix[:, included].sum(axis=1) > 0 if included else False
+        if self.min_score:
+            # Titles not in the catalog have no MAL score and are dropped too
+            eligible &= self._scores >= self.min_score
+        if self.anchors:
+            # The titles being compared against are not results themselves
+            eligible &= ~np.isin(self._mal_ids, self.anchors)
+        return eligible
+
+    def ranking(self) -> np.ndarray:
+        """Pool positions of eligible candidates in MMR order (cached until something changes)"""
+        if self._ranking is not None:
+            return self._ranking
+        candidates = np.flatnonzero(self._eligible()) if self.candidates else np.array([], dtype=int)
+        relevance = self._relevance()[candidates] if len(candidates) else np.array([])
+        sims = self._sims[np.ix_(candidates, candidates)] if len(candidates) else np.zeros((0, 0))
+
+        # Maximal marginal relevance: trade relevance against the closest already-picked title
+        order = []
+        remaining = np.ones(len(candidates), dtype=bool)
+        closest = np.zeros(len(candidates), dtype=np.float32)
+        for _ in range(len(candidates)):
+            mmr = (1 - self.diversity) * relevance - self.diversity * closest
+            mmr[~remaining] = -np.inf
+            best = int(np.argmax(mmr))
+            order.append(best)
+            remaining[best] = False
+            closest = np.maximum(closest, sims[best])
+
+        self._ranking = candidates[order] if order else candidates
+        return self._ranking
+
+    def has_page(self, page: int) -> bool:
+        """Whether `page` can be filled entirely from the pool"""
+        return len(self.ranking()) >= (page + 1) * self.page_size
+
+    def results(self, page: int = 0) -> List[Dict]:
+        start = page * self.page_size
+        return [self.candidates[i] for i in self.ranking()[start:start + self.page_size]]
+
+    def describe(self) -> str:
+        """The query plus refinements, for asking the LLM for more candidates"""
+        return ", ".join([self.query] + self.refinements)
+
+    def to_dict(self) -> Dict:
+        return {
+            "query": self.query,
+            "page_size": self.page_size,
+            "candidates": self.candidates,
+            "refinements": self.refinements,
+            "include": sorted(self.include),
+            "exclude": sorted(self.exclude),
+            "genre_weights": self.genre_weights,
+            "term_weights": self.term_weights,
+            "anchors": self.anchors,
+            "min_score": self.min_score
+        }
+
+    @classmethod
+    def from_dict(
+        cls,
+        state: Dict,
+        catalog: AnimeCatalog,
+        embeddings: Optional[TitleEmbeddings] = None,
+        diversity: float = 0.3
+    ) -> "ResultSession":
+        try:
+            candidates = state.get("candidates", [])
+            if len(candidates) > cls.MAX_CANDIDATES:
+                raise ValueError(f"Session pool larger than {cls.MAX_CANDIDATES} candidates")
+            query = state["query"]
+            refinements = list(state.get("refinements", []))
+            if not isinstance(query, str) or len(query) > cls.MAX_TEXT_LEN:
+                raise ValueError(f"Query must be text of at most {cls.MAX_TEXT_LEN} characters")
+            if len(refinements) > cls.MAX_REFINEMENTS or not all(
+                isinstance(text, str) and len(text) <= cls.MAX_TEXT_LEN for text in refinements
+            ):
+                raise ValueError(
+                    f"At most {cls.MAX_REFINEMENTS} refinements of at most {cls.MAX_TEXT_LEN} characters"
+                )
+            page_size = min(max(int(state.get("page_size", 5)), 1), cls.MAX_PAGE_SIZE)
+            session = cls(query, catalog, embeddings, page_size, diversity)
+            session.refinements = refinements
+            session.include = set(state.get("include", []))
+            session.exclude = set(state.get("exclude", []))
+            session.genre_weights = {str(k): float(v) for k, v in state.get("genre_weights", {}).items()}
+            session.term_weights = {str(k): float(v) for k, v in state.get("term_weights", {}).items()}
+            session.anchors = [int(mal_id) for mal_id in state.get("anchors", [])]
+            session.min_score = float(state["min_score"]) if state.get("min_score") else None
+            session.add([dict(candidate) for candidate in candidates])
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            raise ValueError(f"Invalid session state: {str(e)}")
+        return session
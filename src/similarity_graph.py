@@ -0,0 +1,85 @@
+import numpy as np
+from pathlib import Path
+from typing import Dict, List, Tuple
+from utils.custom_exception import CustomException
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+class SimilarityGraph:
+    """
+    Precomputed top-N nearest neighbours for every catalog title.
+
+    Stored compactly: MAL ids as int32 and cosine scores as float16, so a
+    lookup is a dict hit plus a row slice - no embedding or LLM call.
+    """
+
+    def __init__(self, mal_ids: np.ndarray, neighbours: np.ndarray, scores: np.ndarray):
+        self.mal_ids = mal_ids.astype(np.int32, copy=False)
+        self.neighbours = neighbours.astype(np.int32, copy=False)
+        self.scores = scores.astype(np.float16, copy=False)
+        self._row_of: Dict[int, int] = {int(mal_id): row for row, mal_id in enumerate(self.mal_ids)}
+
+    @classmethod
+    def build(
+        cls,
+        embeddings: np.ndarray,
+        mal_ids: np.ndarray,
+        top_n: int = 20,
+        block_size: int = 1024
+    ) -> "SimilarityGraph":
+        """
+        Blocked all-pairs cosine similarity: each block of rows is multiplied
+        against the full matrix, so peak memory is block_size x n floats.
+        """
+        mal_ids = np.asarray(mal_ids, dtype=np.int32)
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.maximum(norms, 1e-12)
+        n = len(vectors)
+        top_n = min(top_n, n - 1)
+        if top_n < 1:
+            raise CustomException("Need at least two titles to build a similarity graph")
+
+        neighbours = np.empty((n, top_n), dtype=np.int32)
+        scores = np.empty((n, top_n), dtype=np.float16)
+        for start in range(0, n, block_size):
+            end = min(start + block_size, n)
+            sims = vectors[start:end] @ vectors.T
+            # A title is not its own neighbour
+            sims[np.arange(end - start), np.arange(start, end)] = -np.inf
+
+            candidates = np.argpartition(-sims, top_n - 1, axis=1)[:, :top_n]
+            candidate_scores = np.take_along_axis(sims, candidates, axis=1)
+            order = np.argsort(-candidate_scores, axis=1)
+            neighbours[start:end] = mal_ids[np.take_along_axis(candidates, order, axis=1)]
+            scores[start:end] = np.take_along_axis(candidate_scores, order, axis=1)
+
+        logger.info(f"Similarity graph built: {n} titles x {top_n} neighbours")
+        return cls(mal_ids, neighbours, scores)
+
+    def save(self, path: str) -> None:
+        try:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            np.savez(path, mal_ids=self.mal_ids, neighbours=self.neighbours, scores=self.scores)
+            logger.info(f"Similarity graph saved to {path}")
+        except Exception as e:
+            raise CustomException("Failed to save similarity graph", e, {"path": path})
+
+    @classmethod
+    def load(cls, path: str) -> "SimilarityGraph":
+        try:
+            with np.load(path) as data:
+                return cls(data["mal_ids"], data["neighbours"], data["scores"])
+        except Exception as e:
+            raise CustomException("Failed to load similarity graph", e, {"path": path})
+
+    def __contains__(self, mal_id: int) -> bool:
+        return mal_id in self._row_of
+
+    def neighbours_of(self, mal_id: int, k: int = 10) -> List[Tuple[int, float]]:
+        """(mal_id, cosine score) of the k most similar titles, best first"""
+        row = self._row_of.get(mal_id)
+        if row is None:
+            return []
+        return list(zip(self.neighbours[row, :k].tolist(), self.scores[row, :k].tolist()))
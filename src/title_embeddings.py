@@ -0,0 +1,52 @@
+import numpy as np
+from pathlib import Path
+from typing import Dict, Iterable, Tuple
+from utils.custom_exception import CustomException
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+class TitleEmbeddings:
+    """
+    One unit-norm embedding per catalog title, keyed by MAL id.
+
+    Written next to the similarity graph at build time so serve-time
+    reranking can compare candidates without touching the vector store.
+    Stored as float16; rows are widened to float32 on lookup.
+    """
+
+    def __init__(self, mal_ids: np.ndarray, vectors: np.ndarray):
+        self.mal_ids = np.asarray(mal_ids, dtype=np.int32)
+        self.vectors = np.asarray(vectors, dtype=np.float16)
+        self._row_of: Dict[int, int] = {int(mal_id): row for row, mal_id in enumerate(self.mal_ids)}
+
+    @property
+    def dim(self) -> int:
+        return self.vectors.shape[1]
+
+    def save(self, path: str) -> None:
+        try:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            np.savez(path, mal_ids=self.mal_ids, vectors=self.vectors)
+            logger.info(f"Title embeddings saved to {path}")
+        except Exception as e:
+            raise CustomException("Failed to save title embeddings", e, {"path": path})
+
+    @classmethod
+    def load(cls, path: str) -> "TitleEmbeddings":
+        try:
+            with np.load(path) as data:
+                return cls(data["mal_ids"], data["vectors"])
+        except Exception as e:
+            raise CustomException("Failed to load title embeddings", e, {"path": path})
+
+    def __contains__(self, mal_id: int) -> bool:
+        return mal_id in self._row_of
+
+    def matrix(self, mal_ids: Iterable) -> Tuple[np.ndarray, np.ndarray]:
+        """(vectors, found) for `mal_ids`; unknown ids get a zero row and found=False"""
+        rows = np.array([self._row_of.get(mal_id, -1) if mal_id is not None else -1 for mal_id in mal_ids])
+        found = rows >= 0
+        vectors = np.zeros((len(rows), self.dim), dtype=np.float32)
+        vectors[found] = self.vectors[rows[found]]
+        return vectors, found
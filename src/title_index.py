@@ -0,0 +1,194 @@
+import csv
+import re
+import unicodedata
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+from src.catalog import AnimeCatalog
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+_PARENTHETICAL = re.compile(r"\s*\((tv|movie|ova|ona|special)\)\s*$", re.IGNORECASE)
+_SUBTITLE = re.compile(r"\s*(:| - )\s*")
+
+def normalize_title(title: str) -> str:
+    """Accent-, case- and punctuation-insensitive key: 'Ranma ½!' -> 'ranma 1 2'"""
+    text = unicodedata.normalize("NFKD", title)
+    text = "".join(char for char in text if not unicodedata.combining(char)).lower()
+    text = _NON_ALNUM.sub(" ", text.replace("&", " and ")).strip()
+    return text[4:] if text.startswith("the ") else text
+
+def fold_romaji(key: str) -> str:
+    """Collapse long-vowel spellings so 'Kyou kara Maou' == 'Kyo kara Mao'"""
+    return key.replace("ou", "o").replace("oo", "o").replace("uu", "u")
+
+def _trigrams(key: str) -> Set[str]:
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def _within_one_edit(a: str, b: str) -> bool:
+    """One insertion, deletion, substitution or adjacent swap apart (or equal)"""
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) == len(b):
+        diffs = [i for i in range(len(a)) if a[i] != b[i]]
+        return len(diffs) == 1 or (
+            len(diffs) == 2 and diffs[1] == diffs[0] + 1
+            and a[diffs[0]] == b[diffs[1]] and a[diffs[1]] == b[diffs[0]]
+        )
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    return a[i:] == b[i + 1:]
+
+def _words_align(query: str, key: str) -> bool:
+    """
+    Every word on each side has a counterpart on the other, allowing one
+    typo per word. Sequel/spin-off words ('brotherhood', 'super', '00')
+    have none, so 'Dragon Ball Super' does not resolve to 'Dragon Ball'.
+    Words with digits must match exactly.
+    """
+    def has_counterpart(word: str, others: List[str]) -> bool:
+        if not word.isalpha():
+            return word in others
+        return any(other.isalpha() and _within_one_edit(word, other) for other in others)
+
+    query_words, key_words = query.split(), key.split()
+    if all(has_counterpart(word, key_words) for word in query_words) and \
+            all(has_counterpart(word, query_words) for word in key_words):
+        return True
+    # A typo that moved or dropped a space: 'Arct he Lad', 'Cowboybebop'
+    return query.replace(" ", "") == key.replace(" ", "")
+
+class TitleIndex:
+    """
+    Maps free-form titles (as written by the LLM) to catalog rows.
+
+    Lookup order: exact normalized key -> romaji-folded key -> trigram Dice
+    similarity, accepted only if the words of both titles line up (so a
+    sequel or spin-off is not taken for the original). Keys cover the
+    catalog name, the name without a '(TV)'-style suffix, the part before a
+    subtitle, and English/Japanese aliases from `aliases_path` (alias,mal_id).
+    """
+
+    def __init__(
+        self,
+        catalog: AnimeCatalog,
+        aliases_path: str = "data/title_aliases.csv",
+        min_similarity: float = 0.65
+    ):
+        self.catalog = catalog
+        self.min_similarity = min_similarity
+        self._exact: Dict[str, int] = {}
+        self._folded: Dict[str, int] = {}
+        self._keys: List[str] = []
+        self._key_positions: List[int] = []
+        self._key_trigram_counts: List[int] = []
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+        self._build(aliases_path)
+
+    def _add_key(self, key: str, position: int) -> None:
+        # First writer wins: full catalog names, then aliases, then derived keys,
+        # so 'Cowboy Bebop' is never shadowed by 'Cowboy Bebop: Tengoku no Tobira'
+        if not key or key in self._exact:
+            return
+        self._exact[key] = position
+        self._folded.setdefault(fold_romaji(key), position)
+
+        key_id = len(self._keys)
+        grams = _trigrams(key)
+        self._keys.append(key)
+        self._key_positions.append(position)
+        self._key_trigram_counts.append(len(grams))
+        for gram in grams:
+            self._postings[gram].append(key_id)
+
+    def _build(self, aliases_path: str) -> None:
+        records = self.catalog.records
+        for position, record in enumerate(records):
+            self._add_key(normalize_title(record["name"]), position)
+
+        # Curated aliases take precedence over keys derived from names
+        if Path(aliases_path).exists():
+            with open(aliases_path, encoding="utf-8") as f:
+                for row in csv.DictReader(f):
+                    position = self.catalog.position_of(int(row["mal_id"]))
+                    if position is not None:
+                        self._add_key(normalize_title(row["alias"]), position)
+
+        for position, record in enumerate(records):
+            name = _PARENTHETICAL.sub("", record["name"])
+            self._add_key(normalize_title(name), position)
+            base = _SUBTITLE.split(name, maxsplit=1)[0]
+            self._add_key(normalize_title(base), position)
+
+        logger.info(f"Title index built: {len(self._keys)} keys for {len(records)} titles")
+
+    def match(self, title: str) -> Optional[Tuple[int, float]]:
+        """(catalog position, similarity in 0-1) of the best match, or None"""
+        key = normalize_title(title)
+        if not key:
+            return None
+        position = self._exact.get(key)
+        if position is not None:
+            return position, 1.0
+        # Past the exact lookup a '(TV)'-style suffix is noise, not a distinguishing word
+        key = normalize_title(_PARENTHETICAL.sub("", title)) or key
+        position = self._exact.get(key)
+        if position is not None:
+            return position, 1.0
+        position = self._folded.get(fold_romaji(key))
+        if position is not None:
+            return position, 0.95
+
+        grams = _trigrams(key)
+        shared: Dict[int, int] = defaultdict(int)
+        for gram in grams:
+            for key_id in self._postings.get(gram, ()):
+                shared[key_id] += 1
+        if not shared:
+            return None
+
+        candidates = []
+        for key_id, count in shared.items():
+            score = 2 * count / (len(grams) + self._key_trigram_counts[key_id])
+            if score >= self.min_similarity:
+                candidates.append((score, key_id))
+        for score, key_id in sorted(candidates, reverse=True):
+            if _words_align(key, self._keys[key_id]):
+                return self._key_positions[key_id], round(score, 3)
+        return None
+
+    def lookup(self, title: str) -> Optional[Dict]:
+        found = self.match(title)
+        return None if found is None else self.catalog.get(found[0])
+
+    def enrich(self, recommendations: List[Dict]) -> List[Dict]:
+        """
+        Fill catalog metadata into LLM recommendations in place.
+        Genres come from the catalog; a missing description is taken from
+        the synopsis. Unmatched items keep what the LLM wrote.
+        """
+        matched = 0
+        for rec in recommendations:
+            found = self.match(rec.get('anime', ''))
+            if found is None:
+                # Lean-prompt items carry no description of their own
+                rec['description'] = rec.get('description') or rec.get('why', '')
+                continue
+            record = self.catalog.get(found[0])
+            matched += 1
+            rec['mal_id'] = record['mal_id']
+            rec['catalog_title'] = record['name']
+            rec['catalog_score'] = record['score']
+            rec['genres'] = record['genres'] or rec.get('genres', [])
+            if not rec.get('description'):
+                rec['description'] = self.catalog.short_synopsis(record['synopsis'])
+        logger.info(f"Catalog grounding matched {matched}/{len(recommendations)} titles")
+        return recommendations
@@ -0,0 +1,113 @@
+import math
+import threading
+from typing import Dict, List, Optional
+from utils.logger import logger
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except Exception:  # tiktoken is optional; fall back to a character heuristic
+    _ENCODING = None
+
+# Average characters per token for English prose with BPE tokenizers
+CHARS_PER_TOKEN = 4
+
+def estimate_tokens(text: str) -> int:
+    """
+    Local token estimate. Groq's Llama tokenizer differs from cl100k, so this
+    is an approximation either way; the reported `usage` is the ground truth.
+    """
+    if not text:
+        return 0
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+def estimate_message_tokens(messages: List[Dict]) -> int:
+    """Chat messages carry ~4 tokens of role/format overhead each"""
+    return sum(estimate_tokens(message.get("content", "")) + 4 for message in messages) + 2
+
+def max_tokens_for(n_items: int, tokens_per_item: int = 150, overhead: int = 40, cap: int = 2048) -> int:
+    """Output budget sized to the number of items requested instead of a fixed ceiling"""
+    return min(cap, overhead + n_items * tokens_per_item)
+
+def max_items_for(cap: int, tokens_per_item: int = 150, overhead: int = 40) -> int:
+    """Most items whose output still fits under `cap` - the inverse of max_tokens_for"""
+    return max(1, (cap - overhead) // tokens_per_item)
+
+def trim_to_budget(snippets: List[str], budget: int) -> List[str]:
+    """
+    Keep snippets in rank order until the token budget is spent.
+    The snippet that crosses the budget is cut at a word boundary.
+    """
+    kept, used = [], 0
+    for snippet in snippets:
+        cost = estimate_tokens(snippet)
+        if used + cost <= budget:
+            kept.append(snippet)
+            used += cost
+            continue
+        remaining = budget - used
+        if remaining > 20:
+            words = snippet.split()
+            cut = words[:max(1, int(len(words) * remaining / cost))]
+            kept.append(" ".join(cut) + " ...")
+        break
+    return kept
+
+class TokenLedger:
+    """Per-model token accounting: local estimates next to reported usage"""
+
+    def __init__(self):
+        self._totals: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        model: str,
+        estimated_prompt: int,
+        max_tokens: int,
+        usage: Optional[Dict] = None
+    ) -> None:
+        usage = usage or {}
+        with self._lock:
+            totals = self._totals.setdefault(model, {
+                "requests": 0,
+                "estimated_prompt_tokens": 0,
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "max_tokens_requested": 0,
+                "truncated": 0
+            })
+            totals["requests"] += 1
+            totals["estimated_prompt_tokens"] += estimated_prompt
+            totals["prompt_tokens"] += usage.get("prompt_tokens", 0)
+            totals["completion_tokens"] += usage.get("completion_tokens", 0)
+            totals["max_tokens_requested"] += max_tokens
+            if usage.get("completion_tokens", 0) >= max_tokens:
+                totals["truncated"] += 1
+
+        logger.info(
+            f"Tokens [{model}]: prompt ~{estimated_prompt} est / "
+            f"{usage.get('prompt_tokens', '?')} reported, "
+            f"completion {usage.get('completion_tokens', '?')}/{max_tokens}"
+        )
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            result = {}
+            for model, totals in self._totals.items():
+                requests = totals["requests"]
+                result[model] = {
+                    **totals,
+                    "avg_completion_tokens": round(totals["completion_tokens"] / requests, 1),
+                    "output_budget_used": (
+                        round(totals["completion_tokens"] / totals["max_tokens_requested"], 3)
+                        if totals["max_tokens_requested"] else None
+                    ),
+                    "estimate_ratio": (
+                        round(totals["estimated_prompt_tokens"] / totals["prompt_tokens"], 3)
+                        if totals["prompt_tokens"] else None
+                    )
+                }
+            return result
@@ -1,11 +1,13 @@
 import os
+import numpy as np
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import Chroma
 from langchain_community.document_loaders.csv_loader import CSVLoader
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_core.documents import Document
+from src.embedding_batcher import MicroBatchEmbedder
 from utils.logger import get_logger
 from utils.custom_exception import CustomException
 from config.config import Config
@@ -83,12 +85,29 @@ class VectorStoreBuilder:
         except Exception as e:
             raise CustomException("Vector store creation failed", e)
 
-    def load_vector_store(self):
-        """Load existing vector store"""
+    def load_vector_store(self, micro_batch: bool = False):
+        """Load existing vector store, optionally batching concurrent query embeddings"""
         try:
+            embedding = MicroBatchEmbedder.from_env(self.embedding) if micro_batch else self.embedding
             return Chroma(
                 persist_directory=self.persist_dir,
-                embedding_function=self.embedding
+                embedding_function=embedding
             )
         except Exception as e:
-            raise CustomException("Failed to load vector store", e)
\ No newline at end of file
+            raise CustomException("Failed to load vector store", e)
+
+    def load_row_embeddings(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Mean chunk embedding per source CSV row, as (rows, unit-norm embeddings)"""
+        try:
+            data = self.load_vector_store().get(include=["embeddings", "metadatas"])
+            chunk_rows = np.array([metadata.get("row", -1) for metadata in data["metadatas"]])
+            vectors = np.asarray(data["embeddings"], dtype=np.float32)
+
+            rows, inverse = np.unique(chunk_rows, return_inverse=True)
+            sums = np.zeros((len(rows), vectors.shape[1]), dtype=np.float32)
+            np.add.at(sums, inverse, vectors)
+            means = sums / np.bincount(inverse)[:, None]
+            means /= np.maximum(np.linalg.norm(means, axis=1, keepdims=True), 1e-12)
+            return rows, means
+        except Exception as e:
+            raise CustomException("Failed to read embeddings from vector store", e)
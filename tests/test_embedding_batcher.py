@@ -0,0 +1,72 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from src.embedding_batcher import MicroBatchEmbedder
+
+class StubEmbeddings:
+    """Records each embed_documents batch; `gate` holds batches back until set"""
+
+    def __init__(self):
+        self.batches = []
+        self.direct = []
+        self.encoding = threading.Event()
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def embed_documents(self, texts):
+        self.encoding.set()
+        self.gate.wait(5)
+        self.batches.append(list(texts))
+        return [[float(len(text))] for text in texts]
+
+    def embed_query(self, text):
+        self.direct.append(text)
+        return [float(len(text))]
+
+@pytest.fixture
+def stub():
+    embeddings = StubEmbeddings()
+    yield embeddings
+    embeddings.gate.set()
+
+def test_concurrent_queries_share_a_batch(stub):
+    embedder = MicroBatchEmbedder(stub, max_batch_size=8, max_wait_ms=200)
+    texts = [f"query {'x' * i}" for i in range(8)]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        vectors = list(pool.map(embedder.embed_query, texts))
+    assert vectors == [[float(len(text))] for text in texts]
+    assert len(stub.batches) < len(texts)
+    assert embedder.stats()["direct_fallbacks"] == 0
+
+def test_batch_size_is_capped(stub):
+    embedder = MicroBatchEmbedder(stub, max_batch_size=2, max_wait_ms=200)
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        list(pool.map(embedder.embed_query, ["a", "b", "c", "d", "e", "f"]))
+    assert all(len(batch) <= 2 for batch in stub.batches)
+
+def test_stuck_batch_falls_back_to_direct_encoding(stub):
+    embedder = MicroBatchEmbedder(stub, max_wait_ms=1, queue_timeout_s=0.1)
+    stub.gate.clear()
+    # The first query's batch is stuck encoding; the second waits behind it
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        first = pool.submit(embedder.embed_query, "first")
+        assert stub.encoding.wait(1)
+        assert embedder.embed_query("second") == [6.0]
+        assert first.result() == [5.0]
+    assert sorted(stub.direct) == ["first", "second"]
+    assert embedder.stats()["direct_fallbacks"] == 2
+
+    # Once the stuck batch finishes, the abandoned query is skipped, not encoded
+    stub.gate.set()
+    assert embedder.embed_query("third") == [5.0]
+    assert not any("second" in batch for batch in stub.batches)
+
+class BrokenEmbeddings(StubEmbeddings):
+    def embed_documents(self, texts):
+        raise RuntimeError("model crashed")
+
+def test_batch_errors_reach_the_caller():
+    embedder = MicroBatchEmbedder(BrokenEmbeddings(), max_wait_ms=1)
+    with pytest.raises(RuntimeError):
+        embedder.embed_query("anything")
+    assert embedder.stats()["direct_fallbacks"] == 0
@@ -0,0 +1,76 @@
+import json
+import pytest
+from src.json_salvage import complete_prefix, extract_objects, loads, repair_truncated, salvage_recommendations
+
+FULL = json.dumps({"recommendations": [
+    {"title": "Cowboy Bebop", "score": 95, "genres": ["Action", "Sci-Fi"]},
+    {"title": "Trigun", "score": 88, "why": "Space western with a \"humanoid typhoon\""},
+    {"title": "Outlaw Star", "score": 80}
+]})
+
+def test_valid_json_is_complete():
+    items, complete = salvage_recommendations(FULL)
+    assert complete
+    assert [item["title"] for item in items] == ["Cowboy Bebop", "Trigun", "Outlaw Star"]
+
+def test_bare_list_is_accepted():
+    items, complete = salvage_recommendations('[{"title": "Trigun", "score": 88}]')
+    assert complete and items == [{"title": "Trigun", "score": 88}]
+
+def cut_before(text: str, marker: str, keep: int = 0) -> str:
+    return text[:text.index(marker) + keep]
+
+@pytest.mark.parametrize("cut, last", [
+    # Cut mid-title: the third item has nothing usable and is dropped
+    (cut_before(FULL, "Outlaw", 3), None),
+    # '"score": 8' may be a cut-off 80 - the score is dropped, the title kept
+    (cut_before(FULL, '"score": 80', 10), {"title": "Outlaw Star"}),
+    # A bare number right at the cut is never trusted, even if it was complete
+    (FULL[:-3], {"title": "Outlaw Star"}),
+    (cut_before(FULL, '"score": 80'), {"title": "Outlaw Star"}),
+])
+def test_truncated_output_keeps_only_received_values(cut, last):
+    items, complete = salvage_recommendations(cut)
+    assert not complete
+    assert [item["title"] for item in items[:2]] == ["Cowboy Bebop", "Trigun"]
+    assert (items[2] if len(items) > 2 else None) == last
+
+@pytest.mark.parametrize("partial, expected", [
+    ('{"title": "A", "score": 9', '{"title": "A"'),
+    ('{"title": "A", "genres": ["Action", "Dra', '{"title": "A"'),
+    ('{"title": "A", "genres": ["Action"]', '{"title": "A", "genres": ["Action"]'),
+    ('{"title": "A", "why": "it\'s', '{"title": "A"'),
+    ('{"title": "A", ', '{"title": "A"'),
+    ('{"title": "A"', '{"title": "A"'),
+    ('{"tit', '{'),
+])
+def test_complete_prefix_drops_the_value_at_the_cut(partial, expected):
+    assert complete_prefix(partial) == expected
+
+def test_non_string_input():
+    assert salvage_recommendations(None) == ([], False)
+    assert salvage_recommendations({"recommendations": []}) == ([], False)
+
+def test_text_around_the_json_is_ignored():
+    items, complete = salvage_recommendations("Sure! Here you go:\n" + FULL + "\nEnjoy!")
+    assert not complete
+    assert len(items) == 3
+
+def test_malformed_object_is_skipped():
+    text = '{"recommendations": [{"title": "A", "score": 1}, {"title": "B" "score": 2}, {"title": "C", "score": 3}]}'
+    objects, partial = extract_objects(text)
+    assert [obj["title"] for obj in objects] == ["A", "C"]
+    assert partial == ""
+
+def test_nothing_to_salvage():
+    assert salvage_recommendations("I can't help with that.") == ([], False)
+
+@pytest.mark.parametrize("fragment, expected", [
+    ('{"title": "Cowboy Be', {"title": "Cowboy Be"}),
+    ('{"title": "A", ', {"title": "A"}),
+    ('{"title": "A", "score":', {"title": "A", "score": None}),
+    ('{"title": "A", "genres": ["Action", "Dra', {"title": "A", "genres": ["Action", "Dra"]}),
+    ('{"title": "back\\', {"title": "back"}),
+])
+def test_repair_truncated(fragment, expected):
+    assert loads(repair_truncated(fragment)) == expected
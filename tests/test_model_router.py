@@ -0,0 +1,104 @@
+import threading
+import time
+import pytest
+from src.model_router import ModelRouter
+from utils.custom_exception import DeadlineExceededError, InvalidResponseError
+from utils.resilience import Deadline
+
+@pytest.fixture
+def release():
+    """Blocks stub calls until the test ends, so no pool thread outlives it"""
+    event = threading.Event()
+    yield event
+    event.set()
+
+def make_router(**kwargs) -> ModelRouter:
+    options = dict(default_hedge_delay_s=0.05, hedge_min_s=0.01, max_workers=4)
+    options.update(kwargs)
+    return ModelRouter("big", fast_model="small", **options)
+
+def stub(**behaviour):
+    """call(model) that runs behaviour[model]: a result list, an exception, or a callable"""
+    def call(model):
+        action = behaviour[model]
+        if callable(action):
+            action = action()
+        if isinstance(action, Exception):
+            raise action
+        return action
+    return call
+
+def after(seconds, outcome):
+    def action():
+        time.sleep(seconds)
+        return outcome
+    return action
+
+def test_fast_primary_is_not_hedged():
+    router = make_router()
+    result = router.execute("big", "small", stub(big=[{"anime": "A"}], small=[]), Deadline(2))
+    assert result == [{"anime": "A"}]
+    stats = router.stats()
+    assert stats["small"]["hedges_launched"] == 0
+    assert stats["big"]["requests"] == 1
+
+def test_hedge_wins_and_primary_is_abandoned(release):
+    router = make_router()
+    call = stub(big=lambda: release.wait(5) and [], small=[{"anime": "B"}])
+    assert router.execute("big", "small", call, Deadline(2)) == [{"anime": "B"}]
+    stats = router.stats()
+    assert stats["small"]["hedges_launched"] == 1
+    assert stats["small"]["hedge_wins"] == 1
+    assert stats["big"]["abandoned"] == 1
+
+def test_first_valid_answer_wins_after_primary_is_invalid():
+    router = make_router()
+    call = stub(
+        big=after(0.1, InvalidResponseError(message="garbled")),
+        small=after(0.2, [{"anime": "B"}])
+    )
+    assert router.execute("big", "small", call, Deadline(2)) == [{"anime": "B"}]
+    stats = router.stats()
+    assert stats["big"]["valid_json_rate"] == 0.0
+    assert stats["small"]["hedge_wins"] == 1
+
+def test_primary_error_is_raised_when_every_call_fails():
+    router = make_router()
+    call = stub(big=after(0.1, InvalidResponseError(message="garbled")), small=ValueError("down"))
+    with pytest.raises(InvalidResponseError):
+        router.execute("big", "small", call, Deadline(2))
+
+def test_hedge_rate_is_capped():
+    router = make_router(max_hedge_rate=0.1)
+    call = stub(big=after(0.15, [{"anime": "A"}]), small=after(0.15, [{"anime": "B"}]))
+    for _ in range(3):
+        router.execute("big", "small", call, Deadline(2))
+    # The one saved-up hedge is spent; each later call only earns a tenth of one
+    assert router.stats()["small"]["hedges_launched"] == 1
+
+def test_no_hedge_while_pool_is_backlogged(release):
+    router = make_router(max_workers=4)
+    for _ in range(router.busy_threshold):
+        router._submit("big", lambda model: release.wait(5) and [])
+    call = stub(big=after(0.15, [{"anime": "A"}]), small=[{"anime": "B"}])
+    assert router.execute("big", "small", call, Deadline(2)) == [{"anime": "A"}]
+    assert router.stats()["small"]["hedges_launched"] == 0
+
+def test_deadline_with_both_calls_in_flight(release):
+    router = make_router()
+    blocked = lambda: release.wait(5) and []
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceededError):
+        router.execute("big", "small", stub(big=blocked, small=blocked), Deadline(0.3))
+    assert time.monotonic() - started < 1
+    stats = router.stats()
+    assert stats["big"]["abandoned"] == 1
+    assert stats["small"]["abandoned"] == 1
+
+def test_unhedged_call_stops_at_the_deadline(release):
+    router = make_router(hedge_enabled=False)
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceededError):
+        router.execute("big", None, stub(big=lambda: release.wait(5) and []), Deadline(0.2))
+    assert time.monotonic() - started < 1
+    assert router.stats()["big"]["abandoned"] == 1
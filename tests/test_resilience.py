@@ -0,0 +1,124 @@
+import time
+import pytest
+from utils.custom_exception import DeadlineExceededError, InvalidResponseError
+from utils.resilience import CircuitBreaker, Deadline
+
+def tripped_breaker(**kwargs) -> CircuitBreaker:
+    breaker = CircuitBreaker("test", failure_threshold=2, cooldown_s=0.0, **kwargs)
+    breaker.record_failure()
+    breaker.record_failure()
+    return breaker
+
+def test_deadline_clamp_and_reserve():
+    deadline = Deadline(10)
+    assert deadline.clamp(20) <= 10
+    assert deadline.clamp(1) == 1
+    assert deadline.reserve(4).remaining() <= 6
+    assert Deadline(0).expired()
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker("test", failure_threshold=2, cooldown_s=60)
+    breaker.record_failure()
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+def test_success_resets_failure_count():
+    breaker = CircuitBreaker("test", failure_threshold=2, cooldown_s=60)
+    breaker.record_failure()
+    breaker.record_success(0.1)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_slow_calls_trip_the_breaker():
+    breaker = CircuitBreaker("test", slow_threshold=2, latency_slo_s=1.0, cooldown_s=60)
+    breaker.record_success(2.0)
+    breaker.record_success(2.0)
+    assert breaker.state == CircuitBreaker.OPEN
+
+def test_half_open_lets_one_probe_through():
+    breaker = tripped_breaker()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+    breaker.record_success(0.1)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow_request()
+
+def test_failed_probe_reopens():
+    breaker = tripped_breaker()
+    breaker.cooldown_s = 60
+    breaker._opened_at = time.monotonic() - 61
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+def test_release_probe_frees_the_half_open_slot():
+    breaker = tripped_breaker()
+    assert breaker.allow_request()
+    breaker.release_probe()
+    assert breaker.allow_request()
+
+def test_release_probe_is_a_noop_when_closed():
+    breaker = CircuitBreaker("test")
+    breaker.release_probe()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow_request()
+
+@pytest.fixture
+def recommender(monkeypatch):
+    monkeypatch.setenv("HEDGE_ENABLED", "0")
+    from src.recommender import AnimeRecommender
+    recommender = AnimeRecommender()
+    recommender.breaker = tripped_breaker()
+    return recommender
+
+def test_spent_deadline_does_not_take_the_probe(recommender):
+    with pytest.raises(DeadlineExceededError):
+        recommender.get_recommendations("action anime", deadline=Deadline(0.1))
+    assert recommender.breaker.allow_request()
+
+def test_call_that_never_starts_releases_the_probe(recommender):
+    # Probe taken, then the deadline runs out before the POST (e.g. queued behind other calls)
+    assert recommender.breaker.allow_request()
+    with pytest.raises(DeadlineExceededError):
+        recommender._call_model(recommender.model, "action anime", Deadline(0.1))
+    assert recommender.breaker.state == CircuitBreaker.HALF_OPEN
+    assert recommender.breaker.allow_request()
+
+def test_followup_questions_close_a_half_open_breaker(recommender, monkeypatch):
+    content = {"choices": [{"message": {"content": "1. More action?\n2. Older titles?"}}]}
+    monkeypatch.setattr(recommender, "_post", lambda payload, timeout: content)
+    questions = recommender.followup_questions([{"anime": "Cowboy Bebop", "why": "space"}])
+    assert questions == ["More action?", "Older titles?"]
+    assert recommender.breaker.state == CircuitBreaker.CLOSED
+
+def test_malformed_followup_answer_reopens_the_breaker(recommender, monkeypatch):
+    monkeypatch.setattr(recommender, "_post", lambda payload, timeout: {"choices": []})
+    with pytest.raises(IndexError):
+        recommender.followup_questions([{"anime": "Cowboy Bebop"}])
+    assert recommender.breaker._state == CircuitBreaker.OPEN
+
+@pytest.mark.parametrize("content", [
+    {"choices": [{"message": {"content": None}}]},
+    ["not", "an", "envelope"],
+])
+def test_malformed_completion_does_not_wedge_the_probe(recommender, monkeypatch, content):
+    monkeypatch.setattr(recommender, "_post", lambda payload, timeout: content)
+    assert recommender.breaker.allow_request()
+    with pytest.raises(InvalidResponseError):
+        recommender._call_model(recommender.model, "action anime", Deadline(5))
+    assert recommender.breaker._state == CircuitBreaker.OPEN
+    # Cooldown is 0 in the fixture, so the next probe is let through
+    assert recommender.breaker.allow_request()
+
+def test_unexpected_error_releases_the_probe(recommender, monkeypatch):
+    def boom(payload, timeout):
+        raise RuntimeError("bug")
+    monkeypatch.setattr(recommender, "_post", boom)
+    assert recommender.breaker.allow_request()
+    with pytest.raises(RuntimeError):
+        recommender._call_model(recommender.model, "action anime", Deadline(5))
+    assert recommender.breaker.allow_request()
@@ -0,0 +1,98 @@
+import pytest
+from src.session import parse_refinement
+
+GENRES = ["Action", "Comedy", "Dementia", "Horror", "Mecha", "Military", "Martial Arts",
+          "Psychological", "Romance", "Sci-Fi", "Slice of Life", "Space"]
+
+def parse(text, lookup=None):
+    return parse_refinement(text, GENRES, lookup)
+
+def test_exclude_and_demote_genres():
+    refinement = parse("less violent, no mecha")
+    assert refinement.exclude == {"Mecha"}
+    assert refinement.genre_weights["Horror"] < 0
+    assert refinement.genre_weights["Action"] < 0
+    assert not refinement.term_weights
+
+def test_only_and_more():
+    refinement = parse("only romance and more comedy")
+    assert refinement.include == {"Romance"}
+    assert refinement.genre_weights == {"Comedy": 1.0}
+
+def test_mixed_genre_and_keyword():
+    refinement = parse("space pirates")
+    assert refinement.genre_weights == {"Space": 1.0}
+    assert refinement.term_weights == {"pirates": 1.0}
+
+@pytest.mark.parametrize("text", [
+    "nothing scary", "avoid horror", "don't want horror", "I don’t want anything scary",
+    "do not want gore", "no more horror", "without horror at all"
+])
+def test_negations_exclude(text):
+    refinement = parse(text)
+    assert refinement.exclude == {"Horror"}
+    assert not refinement.term_weights
+    assert not refinement.genre_weights
+
+@pytest.mark.parametrize("text", ["not so much romance", "less of the romance", "not too much romance"])
+def test_softened_negations_demote(text):
+    refinement = parse(text)
+    assert refinement.genre_weights == {"Romance": -1.0}
+    assert not refinement.exclude
+    assert not refinement.term_weights
+
+def test_filler_words_are_not_keywords():
+    refinement = parse("I want more action please, really funny stuff")
+    assert refinement.genre_weights["Action"] == 1.0
+    assert refinement.genre_weights["Comedy"] == 1.0
+    assert not refinement.term_weights
+
+def test_like_title_and_ratings():
+    catalog = {"cowboy bebop": {"mal_id": 1}}
+    refinement = parse("more like cowboy bebop, higher rated, like frieren", catalog.get)
+    assert refinement.anchors == [1]
+    assert refinement.raise_min_score
+    assert refinement.notes == ["Couldn't find 'frieren' in our catalog"]
+
+def test_unsupported_refinements_are_noted():
+    refinement = parse("shorter, newer")
+    assert len(refinement.notes) == 2
+    assert not refinement.term_weights
+
+@pytest.fixture(scope="module")
+def catalog():
+    from pathlib import Path
+    from src.catalog import AnimeCatalog
+    return AnimeCatalog(str(Path(__file__).resolve().parents[1] / "data" / "anime_with_synopsis.csv"))
+
+def test_session_tolerates_null_and_mistyped_fields(catalog):
+    from src.session import ResultSession
+    session = ResultSession("space western", catalog, page_size=2)
+    added = session.add([
+        {"anime": "Made-up Show", "description": None, "genres": None, "match_score": "88"},
+        {"anime": "Another One", "description": 42, "genres": "Action, Comedy", "match_score": None},
+        {"anime": None, "description": "no title"},
+        {"anime": "Cowboy Bebop", "mal_id": "1", "genres": ["Action", None], "match_score": 95},
+    ])
+    assert added == 3
+    session.apply("more action")
+    assert [rec["anime"] for rec in session.results(0)] == ["Cowboy Bebop", "Made-up Show"]
+
+    restored = ResultSession.from_dict(session.to_dict(), catalog)
+    restored.apply("no comedy")
+    assert [rec["anime"] for rec in restored.results(0)] == ["Made-up Show"]
+
+def test_session_state_from_client_is_bounded(catalog):
+    from src.session import ResultSession
+    state = ResultSession("space western", catalog).to_dict()
+    for bad in ({"candidates": 5}, {"query": "x" * 201}, {"refinements": ["x" * 201]}, {"query": None}):
+        with pytest.raises(ValueError):
+            ResultSession.from_dict(dict(state, **bad), catalog)
+    assert ResultSession.from_dict(dict(state, page_size=0), catalog).page_size == 1
+    assert ResultSession.from_dict(dict(state, page_size=500), catalog).page_size == ResultSession.MAX_PAGE_SIZE
+
+    session = ResultSession.from_dict(state, catalog)
+    for i in range(ResultSession.MAX_REFINEMENTS + 5):
+        session.apply(f"more action {i}")
+    assert len(session.refinements) == ResultSession.MAX_REFINEMENTS
+    ResultSession.from_dict(session.to_dict(), catalog)
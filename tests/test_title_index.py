@@ -0,0 +1,58 @@
+from pathlib import Path
+import pytest
+from src.catalog import AnimeCatalog
+from src.title_index import TitleIndex, fold_romaji, normalize_title
+
+DATA = Path(__file__).resolve().parents[1] / "data"
+
+@pytest.fixture(scope="module")
+def index():
+    catalog = AnimeCatalog(str(DATA / "anime_with_synopsis.csv"))
+    return TitleIndex(catalog, aliases_path=str(DATA / "title_aliases.csv"))
+
+def matched_name(index, title):
+    return (index.lookup(title) or {}).get("name")
+
+def test_normalize_title():
+    assert normalize_title("Ranma ½!") == "ranma 1 2"
+    assert normalize_title("The Vision of Escaflowne") == "vision of escaflowne"
+    assert normalize_title("Kenshin & Kaoru") == "kenshin and kaoru"
+    assert fold_romaji("kyou kara maou") == fold_romaji("kyo kara mao")
+
+def test_every_catalog_title_matches_itself(index):
+    for position, record in enumerate(index.catalog.records):
+        assert index.match(record["name"])[0] == position
+
+@pytest.mark.parametrize("title, expected", [
+    ("COWBOY BEBOP", "Cowboy Bebop"),
+    ("Cowbooy Bebop", "Cowboy Bebop"),
+    ("Cowboy Bebop (TV)", "Cowboy Bebop"),
+    ("Cowboy Bebop: The Movie", "Cowboy Bebop: Tengoku no Tobira"),
+    ("Trigun (TV)", "Trigun"),
+    ("Fullmetal Alchemsit", "Fullmetal Alchemist"),
+    ("Spirited Away", "Sen to Chihiro no Kamikakushi"),
+])
+def test_variants_resolve(index, title, expected):
+    assert matched_name(index, title) == expected
+
+@pytest.mark.parametrize("title", [
+    "Mobile Suit Gundam 00",
+    "Fullmetal Alchemist: Brotherhood",
+    "Dragon Ball Super",
+    "Dragon Ball Z",
+    "Trigun Stampede",
+    "One Piece Film Red",
+    "Naruto Shippuden",
+    "Attack on Titan",
+])
+def test_sequels_and_unknown_titles_do_not_match(index, title):
+    assert index.match(title) is None
+
+def test_enrich_fills_catalog_fields(index):
+    recs = [{"anime": "Cowboy Bebop", "description": "", "genres": []}, {"anime": "Frieren", "why": "elves"}]
+    index.enrich(recs)
+    assert recs[0]["catalog_title"] == "Cowboy Bebop"
+    assert "Sci-Fi" in recs[0]["genres"]
+    assert recs[0]["description"]
+    assert "mal_id" not in recs[1]
+    assert recs[1]["description"] == "elves"
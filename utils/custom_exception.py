@@ -67,6 +67,15 @@ class RecommendationError(CustomException):
             context=context
         )
 
+class DeadlineExceededError(RecommendationError):
+    """Raised when the request's time budget runs out before the LLM answers"""
+
+class InvalidResponseError(RecommendationError):
+    """Raised when the LLM answer cannot be decoded into any valid recommendation"""
+
+class CircuitOpenError(RecommendationError):
+    """Raised when the LLM circuit breaker is rejecting calls"""
+
 class APIError(CustomException):
     """Exception for API-related failures"""
     def __init__(
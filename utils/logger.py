@@ -22,3 +22,7 @@ def setup_logger():
     return logging.getLogger(__name__)
 
 logger = setup_logger()
+
+def get_logger(name: str) -> logging.Logger:
+    """Module-level logger sharing the handlers configured above"""
+    return logging.getLogger(name)
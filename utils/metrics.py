@@ -0,0 +1,56 @@
+import bisect
+import threading
+from typing import Dict, List, Optional, Sequence
+
+class Histogram:
+    """
+    Thread-safe fixed-bucket histogram (Prometheus-style upper bounds).
+    Cheap enough to observe on every request.
+    """
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets: List[float] = sorted(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self._count = 0
+        self._sum = 0.0
+        self._max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[slot] += 1
+            self._count += 1
+            self._sum += value
+            self._max = max(self._max, value)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile"""
+        with self._lock:
+            if not self._count:
+                return None
+            target = q * self._count
+            seen = 0
+            for slot, count in enumerate(self._counts):
+                seen += count
+                if seen >= target:
+                    return self.buckets[slot] if slot < len(self.buckets) else self._max
+            return self._max
+
+    def snapshot(self) -> Dict:
+        p50, p95, p99 = self.quantile(0.50), self.quantile(0.95), self.quantile(0.99)
+        with self._lock:
+            labels = [f"le_{bound:g}" for bound in self.buckets] + ["le_inf"]
+            return {
+                "count": self._count,
+                "mean": round(self._sum / self._count, 3) if self._count else None,
+                "max": round(self._max, 3),
+                "p50": p50,
+                "p95": p95,
+                "p99": p99,
+                "buckets": dict(zip(labels, self._counts))
+            }
+
+# Bucket presets shared across the serve path
+LATENCY_MS_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 20000)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
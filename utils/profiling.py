@@ -0,0 +1,338 @@
+import contextvars
+import cProfile
+import json
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import nullcontext
+from typing import Deque, Dict, List, Optional, Tuple
+from utils.metrics import Histogram, LATENCY_MS_BUCKETS
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+MODES = ("off", "spans", "cprofile", "stacks", "tracemalloc")
+
+# Returned by span()/request() whenever nothing is recorded - no allocation per call
+_NOOP = nullcontext()
+_current_trace: "contextvars.ContextVar[Optional[Trace]]" = contextvars.ContextVar(
+    "profiling_trace", default=None
+)
+
+class Trace:
+    """Timing spans of one sampled request, as (name, offset_s, duration_s)"""
+    __slots__ = ("name", "started", "spans", "cprofiled")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.perf_counter()
+        self.spans: List[Tuple[str, float, float]] = []
+        self.cprofiled = False
+
+    def to_dict(self, total_s: float) -> Dict:
+        return {
+            "name": self.name,
+            "total_ms": round(total_s * 1000, 3),
+            "spans": [
+                {"name": name, "offset_ms": round(offset * 1000, 3), "ms": round(duration * 1000, 3)}
+                for name, offset, duration in list(self.spans)
+            ]
+        }
+
+class _Span:
+    __slots__ = ("trace", "name", "started")
+
+    def __init__(self, trace: Trace, name: str):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self) -> "_Span":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        # list.append is atomic, so hedged calls on other threads can share a trace
+        self.trace.spans.append((self.name, self.started - self.trace.started, time.perf_counter() - self.started))
+        return False
+
+class _Request:
+    """Root of a sampled trace; optionally runs the request under cProfile"""
+
+    def __init__(self, profiler: "Profiler", name: str):
+        self.profiler = profiler
+        self.trace = Trace(name)
+        self.profile: Optional[cProfile.Profile] = None
+
+    def __enter__(self) -> Trace:
+        self.token = _current_trace.set(self.trace)
+        # Only one cProfile can be active per process; concurrent requests go unprofiled
+        if self.profiler.mode == "cprofile" and self.profiler._cprofile_lock.acquire(blocking=False):
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+            self.trace.cprofiled = True
+        return self.trace
+
+    def __exit__(self, *exc) -> bool:
+        total_s = time.perf_counter() - self.trace.started
+        if self.profile is not None:
+            self.profile.disable()
+            self.profiler._cprofile_lock.release()
+        _current_trace.reset(self.token)
+        self.profiler._finish(self.trace, total_s, self.profile)
+        return False
+
+class _ThreadProfile:
+    """
+    cProfile for work a cprofiled request hands to another thread (the LLM
+    calls run on the model router's pool). Merged into the profiler's stats
+    when the work ends, even if the request has already finished.
+    """
+
+    def __init__(self, profiler: "Profiler"):
+        self.profiler = profiler
+        self.profile: Optional[cProfile.Profile] = None
+
+    def __enter__(self) -> "_ThreadProfile":
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+            self.profile = profile
+        except ValueError:
+            # Python 3.12+ profiles every thread from the request's profiler and allows only one
+            pass
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        if self.profile is not None:
+            self.profile.disable()
+            self.profiler._merge_profile(self.profile)
+        return False
+
+class Profiler:
+    """
+    Opt-in profiling for the recommendation hot path.
+
+    off          - span()/request() hand back a shared no-op context manager
+    spans        - a `sample_rate` share of requests records named timing spans
+                   (per-span histograms plus the most recent traces)
+    cprofile     - spans, and sampled requests also run under cProfile, including
+                   work they hand to other threads via thread(); the
+                   aggregated stats are dumped to `output_dir` periodically
+    stacks       - spans, and a background thread samples every thread's stack;
+                   collapsed stacks (flamegraph/speedscope input) are dumped
+    tracemalloc  - spans, and allocations are traced; snapshots are dumped and
+                   the biggest changes since the previous one are logged
+
+    State is per process: under gunicorn each worker profiles itself.
+    """
+
+    def __init__(
+        self,
+        mode: str = "off",
+        sample_rate: float = 0.01,
+        output_dir: str = "profiles",
+        dump_interval_s: float = 60.0,
+        stack_interval_ms: float = 10.0,
+        max_traces: int = 50
+    ):
+        self.mode = "off"
+        self.sample_rate = 0.0
+        self.output_dir = output_dir
+        self.dump_interval_s = dump_interval_s
+        self.stack_interval_s = stack_interval_ms / 1000
+        self.span_ms: Dict[str, Histogram] = {}
+        self.traces: Deque[Dict] = deque(maxlen=max_traces)
+        self._active = False
+        self._lock = threading.RLock()
+        self._cprofile_lock = threading.Lock()
+        self._cprofile_stats: Optional[pstats.Stats] = None
+        self._stacks: Dict[str, int] = {}
+        self._last_snapshot: Optional[tracemalloc.Snapshot] = None
+        self._stop = threading.Event()
+        self._worker_pid: Optional[int] = None
+        self.configure(mode, sample_rate)
+
+    @classmethod
+    def from_env(cls) -> "Profiler":
+        return cls(
+            mode=os.getenv("PROFILING_MODE", "off"),
+            sample_rate=float(os.getenv("PROFILING_SAMPLE_RATE", 0.01)),
+            output_dir=os.getenv("PROFILING_DIR", "profiles"),
+            dump_interval_s=float(os.getenv("PROFILING_DUMP_INTERVAL_S", 60)),
+            stack_interval_ms=float(os.getenv("PROFILING_STACK_INTERVAL_MS", 10))
+        )
+
+    def span(self, name: str):
+        """Time a step of the current sampled request; a no-op otherwise"""
+        if not self._active:
+            return _NOOP
+        trace = _current_trace.get()
+        if trace is None:
+            return _NOOP
+        return _Span(trace, name)
+
+    def request(self, name: str):
+        """Start a trace for a `sample_rate` share of requests"""
+        if not self._active:
+            return _NOOP
+        if self._worker_pid != os.getpid():
+            self._start_worker()
+        if _current_trace.get() is not None or random.random() >= self.sample_rate:
+            return _NOOP
+        return _Request(self, name)
+
+    def thread(self):
+        """Extend a cprofiled request's profile to the current (worker) thread; a no-op otherwise"""
+        if not self._active:
+            return _NOOP
+        trace = _current_trace.get()
+        if trace is None or not trace.cprofiled:
+            return _NOOP
+        return _ThreadProfile(self)
+
+    def configure(self, mode: Optional[str] = None, sample_rate: Optional[float] = None) -> Dict:
+        """Switch mode and/or sampling at runtime (env at startup, admin API later)"""
+        if mode is not None and mode not in MODES:
+            raise ValueError(f"Unknown profiling mode '{mode}', expected one of {MODES}")
+        if sample_rate is not None and not 0 <= sample_rate <= 1:
+            raise ValueError("sample_rate must be between 0 and 1")
+
+        with self._lock:
+            if sample_rate is not None:
+                self.sample_rate = sample_rate
+            if mode is not None and mode != self.mode:
+                # Flush what the old mode collected before switching
+                self._stop.set()
+                self._worker_pid = None
+                if self.mode != "off":
+                    self.dump()
+                if self.mode == "tracemalloc":
+                    tracemalloc.stop()
+                    self._last_snapshot = None
+                if mode == "tracemalloc":
+                    tracemalloc.start(int(os.getenv("PROFILING_TRACEMALLOC_FRAMES", 10)))
+                logger.info(f"Profiling mode '{self.mode}' -> '{mode}' (sample rate {self.sample_rate})")
+                self.mode = mode
+                self._active = mode != "off"
+                if self._active:
+                    self._start_worker()
+        return self.status()
+
+    def _start_worker(self) -> None:
+        """Background dumper/stack sampler, started per process - threads do not survive a fork"""
+        with self._lock:
+            if self._worker_pid == os.getpid() or not self._active:
+                return
+            self._stop = threading.Event()
+            self._worker_pid = os.getpid()
+            threading.Thread(target=self._run, args=(self._stop,), name="profiler", daemon=True).start()
+
+    def _run(self, stop: threading.Event) -> None:
+        next_dump = time.monotonic() + self.dump_interval_s
+        while True:
+            interval = self.stack_interval_s if self.mode == "stacks" else 1.0
+            if stop.wait(interval):
+                return
+            if self.mode == "stacks":
+                self._sample_stacks()
+            if time.monotonic() >= next_dump:
+                try:
+                    self.dump()
+                except Exception as e:
+                    logger.error(f"Profile dump failed: {str(e)}")
+                next_dump = time.monotonic() + self.dump_interval_s
+
+    def _sample_stacks(self) -> None:
+        own = threading.get_ident()
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            key = ";".join(reversed(stack))
+            with self._lock:
+                self._stacks[key] = self._stacks.get(key, 0) + 1
+
+    def _finish(self, trace: Trace, total_s: float, profile: Optional[cProfile.Profile]) -> None:
+        record = trace.to_dict(total_s)
+        with self._lock:
+            for span in [{"name": trace.name, "ms": record["total_ms"]}] + record["spans"]:
+                histogram = self.span_ms.get(span["name"])
+                if histogram is None:
+                    histogram = self.span_ms[span["name"]] = Histogram(LATENCY_MS_BUCKETS)
+                histogram.observe(span["ms"])
+            self.traces.append(record)
+        if profile is not None:
+            self._merge_profile(profile)
+
+    def _merge_profile(self, profile: cProfile.Profile) -> None:
+        with self._lock:
+            if self._cprofile_stats is None:
+                self._cprofile_stats = pstats.Stats(profile)
+            else:
+                self._cprofile_stats.add(profile)
+
+    def dump(self) -> List[str]:
+        """Write everything collected since the last dump to `output_dir`; returns the paths"""
+        with self._lock:
+            os.makedirs(self.output_dir, exist_ok=True)
+            stem = os.path.join(self.output_dir, f"{{}}-{os.getpid()}-{time.strftime('%Y%m%d-%H%M%S')}")
+            paths = []
+
+            if self.traces:
+                path = stem.format("spans") + ".json"
+                with open(path, "w", encoding="utf-8") as f:
+                    json.dump({
+                        "span_ms": {name: h.snapshot() for name, h in self.span_ms.items()},
+                        "traces": list(self.traces)
+                    }, f, indent=2)
+                self.traces.clear()
+                paths.append(path)
+
+            if self._cprofile_stats is not None:
+                path = stem.format("cprofile") + ".prof"
+                self._cprofile_stats.dump_stats(path)
+                self._cprofile_stats = None
+                paths.append(path)
+
+            if self._stacks:
+                path = stem.format("stacks") + ".folded"
+                stacks, self._stacks = self._stacks, {}
+                with open(path, "w", encoding="utf-8") as f:
+                    f.writelines(f"{stack} {count}\n" for stack, count in stacks.items())
+                paths.append(path)
+
+            if tracemalloc.is_tracing():
+                path = stem.format("tracemalloc") + ".snapshot"
+                snapshot = tracemalloc.take_snapshot()
+                snapshot.dump(path)
+                if self._last_snapshot is not None:
+                    for stat in snapshot.compare_to(self._last_snapshot, "lineno")[:5]:
+                        logger.info(f"Allocation change: {stat}")
+                self._last_snapshot = snapshot
+                paths.append(path)
+
+        if paths:
+            logger.info(f"Profiles written: {', '.join(paths)}")
+        return paths
+
+    def status(self) -> Dict:
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "sample_rate": self.sample_rate,
+                "output_dir": self.output_dir,
+                "pid": os.getpid(),
+                "span_ms": {name: h.snapshot() for name, h in self.span_ms.items()},
+                "recent_traces": list(self.traces)[-5:]
+            }
+
+profiler = Profiler.from_env()
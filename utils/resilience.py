@@ -0,0 +1,123 @@
+import threading
+import time
+from typing import Optional
+from utils.logger import logger
+
+class Deadline:
+    """
+    Absolute time budget for one request, propagated through the call chain.
+    Uses the monotonic clock so wall-clock adjustments cannot extend it.
+    """
+    def __init__(self, budget_s: float):
+        self.budget_s = budget_s
+        self.expires_at = time.monotonic() + budget_s
+
+    @classmethod
+    def at(cls, expires_at: float) -> "Deadline":
+        deadline = cls(0)
+        deadline.expires_at = expires_at
+        deadline.budget_s = max(0.0, expires_at - time.monotonic())
+        return deadline
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def clamp(self, timeout: float) -> float:
+        """Shrink a per-call timeout so it never outlives the deadline"""
+        return min(timeout, self.remaining())
+
+    def reserve(self, seconds: float) -> "Deadline":
+        """Child deadline that ends `seconds` early, keeping that time for a fallback"""
+        return Deadline.at(self.expires_at - seconds)
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker with a half-open probe.
+
+    CLOSED    - calls flow; failures and SLO breaches are counted
+    OPEN      - calls are rejected until `cooldown_s` has passed
+    HALF_OPEN - a single probe call is let through; success closes the
+                circuit, failure re-opens it
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 3,
+        slow_threshold: int = 3,
+        latency_slo_s: Optional[float] = None,
+        cooldown_s: float = 30.0
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.slow_threshold = slow_threshold
+        self.latency_slo_s = latency_slo_s
+        self.cooldown_s = cooldown_s
+        self._state = self.CLOSED
+        self._failures = 0
+        self._slow_calls = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _maybe_half_open(self) -> None:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown_s:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = False
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def release_probe(self) -> None:
+        """Hand back a half-open probe that ended without an outcome (e.g. it never reached the API)"""
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._probe_in_flight = False
+
+    def record_success(self, latency_s: float) -> None:
+        with self._lock:
+            if self.latency_slo_s is not None and latency_s > self.latency_slo_s:
+                self._slow_calls += 1
+                if self._state == self.HALF_OPEN or self._slow_calls >= self.slow_threshold:
+                    self._trip(f"{self._slow_calls} calls over {self.latency_slo_s}s SLO")
+                return
+            self._failures = 0
+            self._slow_calls = 0
+            if self._state != self.CLOSED:
+                logger.info(f"Circuit '{self.name}' closed")
+            self._state = self.CLOSED
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._trip(f"{self._failures} consecutive failures")
+
+    def _trip(self, reason: str) -> None:
+        if self._state != self.OPEN:
+            logger.warning(f"Circuit '{self.name}' opened: {reason}")
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._probe_in_flight = False
+        self._failures = 0
+        self._slow_calls = 0